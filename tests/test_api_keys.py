@@ -0,0 +1,90 @@
+# =============================================================================
+# API KEY TESTS
+# Covers where API keys are read from and how the key pool hands them out.
+#
+# Usage: python -m pytest tests
+# =============================================================================
+import os
+import sys
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from utils.env_utils import get_api_keys, parse_env_file  # noqa: E402
+from utils.rate_limit_utils import ApiKeyPool  # noqa: E402
+
+KEY_NAMES = ("WEATHER_API_KEYS", "WEATHER_API_KEY")
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    for name in KEY_NAMES:
+        monkeypatch.delenv(name, raising=False)
+    path = tmp_path / ".env"
+    path.write_text("WEATHER_API_KEYS=file1, file2\n")
+    return str(path)
+
+
+# =============================================================================
+# ENV FILE
+# =============================================================================
+def test_parse_env_file_handles_export_quotes_and_repeats(tmp_path):
+    path = tmp_path / ".env"
+    path.write_text(
+        "# comment\n\nexport WEATHER_API_KEY='one'\nWEATHER_API_KEY=two\nA = \"b\"\n"
+    )
+    assert parse_env_file(path) == {"WEATHER_API_KEY": "one", "A": "b"}
+
+
+def test_api_keys_are_split_and_deduplicated(env_file, monkeypatch):
+    monkeypatch.setenv("WEATHER_API_KEYS", "a,b a, c")
+    assert get_api_keys(KEY_NAMES, env_file) == ["a", "b", "c"]
+
+
+def test_any_key_variable_in_the_environment_beats_the_env_file(env_file, monkeypatch):
+    monkeypatch.setenv("WEATHER_API_KEY", "from-env")
+    assert get_api_keys(KEY_NAMES, env_file) == ["from-env"]
+
+
+def test_env_file_is_used_when_the_environment_has_no_key(env_file):
+    assert get_api_keys(KEY_NAMES, env_file) == ["file1", "file2"]
+
+
+def test_missing_env_file_warns_on_stderr(tmp_path, monkeypatch, capsys):
+    for name in KEY_NAMES:
+        monkeypatch.delenv(name, raising=False)
+    assert get_api_keys(KEY_NAMES, str(tmp_path / "missing.env")) == []
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "not found" in captured.err
+
+
+def test_environment_key_skips_the_env_file(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("WEATHER_API_KEY", "from-env")
+    get_api_keys(KEY_NAMES, str(tmp_path / "never-read.env"))
+    assert capsys.readouterr().err == ""
+
+
+# =============================================================================
+# API KEY POOL
+# =============================================================================
+def test_key_pool_skips_ejected_keys():
+    pool = ApiKeyPool(["a", "b", "c"])
+    assert [pool.acquire() for _ in range(3)] == ["a", "b", "c"]
+
+    pool.eject("b", 60, 429)
+    assert [pool.acquire() for _ in range(4)] == ["a", "c", "a", "c"]
+    assert pool.available() == 2
+
+    usage = {entry["key"]: entry for entry in pool.usage()}
+    assert usage["b"]["ejections"] == 1
+    assert usage["b"]["last_status"] == 429
+
+
+def test_key_pool_uses_the_key_due_back_first_when_all_are_ejected():
+    pool = ApiKeyPool(["a", "b"])
+    pool.eject("a", 60, 401)
+    pool.eject("b", 30, 429)
+    assert pool.acquire() == "b"
@@ -0,0 +1,110 @@
+# =============================================================================
+# DAYTIME TESTS
+# Covers how the weather CLI decides between day and night art from cached
+# sunrise and sunset times and the location's UTC offset.
+#
+# Usage: python -m pytest tests
+# =============================================================================
+import os
+import sys
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "weather-cli"))
+sys.path.insert(0, ROOT_DIR)
+
+import main  # noqa: E402
+
+# 2024-10-18 12:30 UTC
+NOW = 1729254600
+
+
+def make_report(**fields):
+    # A report for a location on UTC, with today's sunrise and sunset
+    report = {
+        "sunrise": "06:30 AM",
+        "sunset": "05:45 PM",
+        "tz_id": None,
+        "is_day": None,
+        "localtime": "2024-10-18 12:30",
+        "localtime_epoch": NOW,
+    }
+    report.update(fields)
+    return SimpleNamespace(**report)
+
+
+def set_clock(monkeypatch, clock):
+    # Move the current time to clock ("HH:MM" UTC) on the day of NOW
+    hours, minutes = map(int, clock.split(":"))
+    now = NOW + (hours * 60 + minutes - (12 * 60 + 30)) * 60
+    monkeypatch.setattr(main.time, "time", lambda: now)
+
+
+@pytest.mark.parametrize(
+    "text, minutes",
+    [
+        ("06:30 AM", 6 * 60 + 30),
+        ("12:05 AM", 5),
+        ("12:30 PM", 12 * 60 + 30),
+        ("05:45 PM", 17 * 60 + 45),
+        ("No sunrise", None),
+        ("", None),
+        (None, None),
+    ],
+)
+def test_parse_clock_time(text, minutes):
+    assert main.parse_clock_time(text) == minutes
+
+
+@pytest.mark.parametrize(
+    "localtime, localtime_epoch, offset",
+    [
+        ("2024-10-18 13:30", 1729254600, 3600),
+        ("2024-10-18 19:00", 1729254600, 6 * 3600 + 1800),
+        # The epoch is sent to the second, the local time to the minute
+        ("2024-10-18 12:30", 1729254600 + 59, 0),
+        ("2024-10-17 23:30", 1729254600, -13 * 3600),
+        (None, 1729254600, None),
+        ("2024-10-18 13:30", None, None),
+        ("not a time", 1729254600, None),
+    ],
+)
+def test_get_utc_offset(localtime, localtime_epoch, offset):
+    assert main.get_utc_offset(localtime, localtime_epoch) == offset
+
+
+@pytest.mark.parametrize(
+    "clock, daytime",
+    [("06:29", False), ("06:30", True), ("12:00", True), ("17:45", False)],
+)
+def test_daytime_follows_sunrise_and_sunset_at_the_location(
+    monkeypatch, clock, daytime
+):
+    set_clock(monkeypatch, clock)
+    # is_day from an earlier fetch must not win over the clock
+    report = make_report(is_day=0 if daytime else 1)
+    assert main.is_daytime(report) is daytime
+
+
+def test_daytime_applies_the_location_offset(monkeypatch):
+    # 12:30 UTC is 21:30 at a location 9 hours ahead
+    set_clock(monkeypatch, "12:30")
+    report = make_report(localtime="2024-10-18 21:30")
+    assert main.is_daytime(report) is False
+
+
+def test_daytime_falls_back_to_is_day_without_astronomy():
+    report = make_report(sunrise=None, sunset="No sunset", is_day=1)
+    assert main.is_daytime(report) is True
+
+
+def test_daytime_uses_the_time_zone_without_an_offset():
+    # A fixed-offset zone where it is around noon right now
+    hours = (12 - datetime.now(timezone.utc).hour) % 24
+    if hours > 14:
+        hours -= 24
+    report = make_report(localtime=None, tz_id=f"Etc/GMT{-hours:+d}", is_day=0)
+    assert main.is_daytime(report) is True
@@ -0,0 +1,94 @@
+# =============================================================================
+# SCHEDULING TESTS
+# Covers the request scheduler and monthly quota.
+#
+# Usage: python -m pytest tests
+# =============================================================================
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "weather-cli"))
+sys.path.insert(0, ROOT_DIR)
+
+import main  # noqa: E402
+from utils.rate_limit_utils import (  # noqa: E402
+    MonthlyQuota,
+    QuotaExceededError,
+    RequestScheduler,
+)
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting"
+        time.sleep(0.005)
+
+
+# =============================================================================
+# REQUEST SCHEDULER
+# =============================================================================
+def test_scheduler_serves_lower_priority_numbers_first():
+    scheduler = RequestScheduler(max_concurrent=1)
+    scheduler.acquire()
+    order = []
+
+    def request(priority):
+        with scheduler.slot(priority):
+            order.append(priority)
+
+    # The batch request queues first, the interactive one overtakes it
+    threads = []
+    for priority in (main.PRIORITY_BATCH, main.PRIORITY_INTERACTIVE):
+        thread = threading.Thread(target=request, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: len(scheduler._waiting) == len(threads))
+
+    scheduler.release()
+    for thread in threads:
+        thread.join(2)
+    assert order == [main.PRIORITY_INTERACTIVE, main.PRIORITY_BATCH]
+
+
+def test_scheduler_limits_the_request_rate():
+    scheduler = RequestScheduler(rate=20, burst=2)
+    start = time.monotonic()
+    for _ in range(6):
+        with scheduler.slot():
+            pass
+    elapsed = time.monotonic() - start
+
+    # Two requests use the burst, the other four wait 1/20 s each
+    assert 0.18 <= elapsed < 1
+
+
+# =============================================================================
+# MONTHLY QUOTA
+# =============================================================================
+def test_quota_adds_up_usage_from_several_processes(tmp_path):
+    first = MonthlyQuota(tmp_path, budget=100)
+    second = MonthlyQuota(tmp_path, budget=100)
+    for _ in range(3):
+        first.consume()
+        second.consume()
+    first.flush()
+    second.flush()
+
+    assert MonthlyQuota(tmp_path, budget=100).used() == 6
+
+
+def test_quota_keeps_the_reserve_for_interactive_requests(tmp_path):
+    quota = MonthlyQuota(tmp_path, budget=3, reserve=1)
+    quota.consume()
+    quota.consume()
+    with pytest.raises(QuotaExceededError):
+        quota.consume()
+    quota.consume(use_reserve=True)
+    with pytest.raises(QuotaExceededError):
+        quota.consume(use_reserve=True)
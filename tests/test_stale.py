@@ -0,0 +1,99 @@
+# =============================================================================
+# STALE-WHILE-REVALIDATE TESTS
+# Covers the stale fallbacks and background revalidation in the weather CLI.
+#
+# Usage: python -m pytest tests
+# =============================================================================
+import os
+import sys
+from concurrent.futures import Future
+from datetime import datetime
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "weather-cli"))
+sys.path.insert(0, ROOT_DIR)
+
+import main  # noqa: E402
+from utils.cache_utils import ResponseCache  # noqa: E402
+
+WEATHER_DATA = {
+    "location": {"name": "London", "lat": 51.52, "lon": -0.11},
+    "current": {"temp_c": 10.0, "condition": {"text": "Sunny", "code": 1000}},
+}
+ASTRONOMY_DATA = {
+    "location": WEATHER_DATA["location"],
+    "astronomy": {"astro": {"moon_phase": "Full Moon"}},
+}
+
+
+# =============================================================================
+# STALE FALLBACK
+# =============================================================================
+def test_stale_fallback_answers_with_stale_data_when_the_fetch_is_slow():
+    fetch = Future()
+    result = main.with_stale_fallback(fetch, "stale", timeout=0.05)
+    assert result.result(1) == "stale"
+
+    # The slow fetch still finishes in the background
+    fetch.set_result("fresh")
+    main.wait_for_background(1)
+    assert not main._background
+
+
+def test_stale_fallback_answers_with_stale_data_when_the_fetch_fails():
+    fetch = Future()
+    result = main.with_stale_fallback(fetch, "stale", timeout=5)
+    fetch.set_exception(ConnectionError("down"))
+    assert result.result(1) == "stale"
+
+
+def test_stale_fallback_prefers_a_fetch_within_the_timeout():
+    fetch = Future()
+    result = main.with_stale_fallback(fetch, "stale", timeout=5)
+    fetch.set_result("fresh")
+    assert result.result(1) == "fresh"
+
+
+def test_revalidate_refreshes_each_key_once_at_a_time():
+    fetches = []
+
+    def submit_fetch():
+        fetches.append(Future())
+        return fetches[-1]
+
+    key = ["current", "test-location", "2026-01-01"]
+    main.revalidate(key, submit_fetch)
+    main.revalidate(key, submit_fetch)
+    assert len(fetches) == 1
+
+    # Once the refresh is done the next one may start
+    fetches[0].set_result(None)
+    main.wait_for_background(1)
+    main.revalidate(key, submit_fetch)
+    assert len(fetches) == 2
+    fetches[1].set_result(None)
+
+
+def test_revalidation_queues_behind_interactive_lookups(tmp_path, monkeypatch):
+    # Current conditions just past their TTL, inside the revalidate window
+    cache = ResponseCache(tmp_path)
+    now = datetime.now()
+    current_entry, astronomy_entry = main.get_cache_entries("London", now)
+    cache.put(current_entry[0], WEATHER_DATA, now.timestamp() - 1)
+    cache.put(astronomy_entry[0], ASTRONOMY_DATA, astronomy_entry[1])
+
+    priorities = []
+
+    def submit_fetch_requests(*args):
+        priorities.append(args[8])
+        future = Future()
+        future.set_result(None)
+        return future
+
+    monkeypatch.setattr(main, "submit_fetch_requests", submit_fetch_requests)
+    report = main.submit_weather_requests(
+        None, "key", "London", cache, priority=main.PRIORITY_INTERACTIVE
+    ).result(1)
+
+    assert report.age is not None
+    assert priorities == [main.PRIORITY_BATCH]
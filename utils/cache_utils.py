@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def get_default_cache_dir(app_name):
+    # Honor the XDG cache location, falling back to ~/.cache
+    base_dir = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(base_dir, "py-projects", app_name)
+
+
+def get_default_data_dir(app_name):
+    # Honor the XDG data location, falling back to ~/.local/share
+    base_dir = os.environ.get("XDG_DATA_HOME") or os.path.join(
+        os.path.expanduser("~"), ".local", "share"
+    )
+    return os.path.join(base_dir, "py-projects", app_name)
+
+
+class ResponseCache:
+    # Persistent on-disk cache of JSON responses.
+    #
+    # Each entry is stored in its own file, named after a hash of the key, and
+    # written atomically (temp file + rename) so concurrent processes never see
+    # a partially written entry. The file modification time doubles as the
+    # "last used" timestamp for LRU eviction once the cache grows past
+    # max_entries. With refresh=True lookups always miss, so every response is
+    # fetched again and written back.
+    #
+    # Keys whose first element is in pinned are kept in a subdirectory that
+    # eviction never scans - for small indexes every other entry depends on,
+    # which would otherwise be evicted alongside the responses.
+
+    # Number of writes between automatic eviction passes (the first write of
+    # every process also triggers one, so short-lived CLI runs stay bounded)
+    PRUNE_INTERVAL = 100
+
+    PINNED_DIR = "pinned"
+
+    def __init__(self, cache_dir, max_entries=1000, refresh=False, pinned=()):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.refresh = refresh
+        self.pinned = frozenset(pinned)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path_for(self, key):
+        digest = hashlib.sha256(json.dumps(key).encode("utf-8")).hexdigest()
+        if key and key[0] in self.pinned:
+            return os.path.join(self.cache_dir, self.PINNED_DIR, f"{digest}.json")
+        return os.path.join(self.cache_dir, f"{digest}.json")
+
+    def get(self, key, allow_stale=False):
+        # Return the cached data for key, or None if missing or expired
+        # (expired entries are still returned with allow_stale=True)
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+        if not allow_stale and entry.get("expires_at", 0) <= time.time():
+            return None
+        return entry.get("data")
+
+    def get_entry(self, key):
+        # Return the whole stored entry for key - data, stored_at and
+        # expires_at - whether expired or not, or None if missing
+        if self.refresh:
+            return None
+
+        path = self._path_for(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def put(self, key, data, expires_at):
+        # Only needed for writes, so keep it off the cached-lookup path
+        import tempfile
+
+        entry = {
+            "key": key,
+            "stored_at": time.time(),
+            "expires_at": expires_at,
+            "data": data,
+        }
+
+        path = self._path_for(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            # Never leave stray temp files behind
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        with self._lock:
+            self._writes += 1
+            should_prune = self._writes % self.PRUNE_INTERVAL == 1
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        # Evict least recently used entries until within max_entries
+        try:
+            entries = []
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".json"):
+                        try:
+                            entries.append((entry.stat().st_mtime, entry.path))
+                        except OSError:
+                            pass
+        except FileNotFoundError:
+            return
+
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+
+        entries.sort()
+        for _, path in entries[:excess]:
+            try:
+                os.remove(path)
+            except OSError:
+                # Another process may have already removed it
+                pass
+
+
+class MemoryCache:
+    # In-process cache with the same get/put interface as ResponseCache, for
+    # long-running processes that want to skip the disk entirely. Entries are
+    # evicted least recently used first once there are more than max_entries.
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Return the cached data for key, or None if missing or expired
+        key = json.dumps(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, data = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return data
+
+    def put(self, key, data, expires_at):
+        key = json.dumps(key)
+        with self._lock:
+            self._entries[key] = (expires_at, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
@@ -1,31 +1,86 @@
 import os
+import sys
+import threading
 
+# Parsed .env files by path, as (mtime_ns, values); values is None for a
+# file that could not be read
+_env_files = {}
+_env_lock = threading.Lock()
 
-def get_api_key(key_name, env_file=None):
-    # If no specific env file is provided, use the one in the root directory
+
+def get_default_env_file():
+    # The .env file in the py-projects root directory
+    root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(root_dir, ".env")
+
+
+def parse_env_file(env_file):
+    values = {}
+    with open(env_file, "r") as f:
+        for line in f:
+            line = line.strip()
+            # Skip empty lines and comments
+            if not line or line.startswith("#"):
+                continue
+            # Allow shell-style "export KEY=value" lines
+            if line.startswith("export "):
+                line = line[len("export ") :].lstrip()
+            # Parse key-value pairs - the first occurrence of a key wins
+            if "=" in line:
+                key, value = line.split("=", 1)
+                # Remove quotes if present
+                values.setdefault(key.strip(), value.strip().strip("\"'"))
+    return values
+
+
+def load_env_file(env_file=None):
+    # Return every key in env_file as a dict, parsing the file only when it
+    # is first read or has changed since (by mtime)
     if env_file is None:
-        # Get the py-projects root directory
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        env_file = os.path.join(root_dir, '.env')
+        env_file = get_default_env_file()
 
     try:
-        with open(env_file, "r") as f:
-            for line in f:
-                line = line.strip()
-                # Skip empty lines and comments
-                if not line or line.startswith("#"):
-                    continue
-                # Parse key-value pairs
-                if "=" in line:
-                    key, value = line.split("=", 1)
-                    key = key.strip()
-                    # If this is the key we're looking for
-                    if key == key_name:
-                        # Remove quotes if present
-                        return value.strip().strip("\"'")
-
-        # Key not found
-        return None
-    except FileNotFoundError:
-        print(f"Warning: {env_file} file not found.")
-        return None
+        mtime = os.stat(env_file).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    with _env_lock:
+        cached = _env_files.get(env_file)
+        if cached is not None and cached[0] == mtime:
+            return cached[1] or {}
+
+        values = None
+        if mtime is not None:
+            try:
+                values = parse_env_file(env_file)
+            except (OSError, UnicodeDecodeError):
+                pass
+        if values is None:
+            # Warn once per file, not on every lookup
+            print(f"Warning: {env_file} file not found.", file=sys.stderr)
+        _env_files[env_file] = (mtime, values)
+        return values or {}
+
+
+def get_api_key(key_name, env_file=None):
+    # Environment variables take precedence over the .env file, which is
+    # only read when the variable is not set
+    value = os.environ.get(key_name)
+    if value:
+        return value
+    return load_env_file(env_file).get(key_name)
+
+
+def get_api_keys(key_names, env_file=None):
+    # Several keys in one comma or whitespace separated value, in order and
+    # without duplicates. Given several names, the first one set wins, and
+    # the environment is checked for all of them before the .env file.
+    if isinstance(key_names, str):
+        key_names = (key_names,)
+    value = next((os.environ[name] for name in key_names if os.environ.get(name)), None)
+    if not value:
+        values = load_env_file(env_file)
+        value = next((values[name] for name in key_names if values.get(name)), None)
+    if not value:
+        return []
+    return list(dict.fromkeys(value.replace(",", " ").split()))
@@ -0,0 +1,22 @@
+import re
+
+# The key parameter of a request URL, as it appears in error messages
+API_KEY_PATTERN = re.compile(r"([?&]key=)[^&\s'\"]+")
+
+
+def mask_api_key(text):
+    # Hide API keys in request URLs quoted by an error message
+    return API_KEY_PATTERN.sub(r"\1***", text)
+
+
+def describe_error(error):
+    # A message for an error from an API call that never shows the request
+    # URL, since it carries the API key: the API's own error message when it
+    # sent one, else the error with any key masked
+    response = getattr(error, "response", None)
+    if response is None:
+        return mask_api_key(str(error))
+    try:
+        return response.json()["error"]["message"]
+    except Exception:
+        return f"upstream returned HTTP {response.status_code}"
@@ -0,0 +1,40 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Statuses worth retrying: rate limiting and transient server errors
+SERVER_ERROR_STATUSES = (500, 502, 503, 504)
+RETRY_STATUSES = (429, *SERVER_ERROR_STATUSES)
+
+
+class NoThrottleRetry(Retry):
+    # Retry that hands a 429 straight back even when it carries Retry-After,
+    # which urllib3 would otherwise sleep through and retry regardless of
+    # status_forcelist
+    RETRY_AFTER_STATUS_CODES = Retry.RETRY_AFTER_STATUS_CODES - {429}
+
+
+def create_session(
+    pool_size=10, retries=3, backoff_factor=0.5, retry_statuses=RETRY_STATUSES
+):
+    # Retry idempotent requests with exponential backoff, honoring any
+    # Retry-After header the server sends with 429/503 responses. Callers
+    # that rotate keys pass SERVER_ERROR_STATUSES to see a 429 straight away.
+    retry_class = Retry if 429 in retry_statuses else NoThrottleRetry
+    retry = retry_class(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=retry_statuses,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        # Hand the final response back so callers can raise_for_status()
+        raise_on_status=False,
+    )
+
+    # One keep-alive connection pool shared by every request in the process
+    adapter = HTTPAdapter(pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
@@ -0,0 +1,258 @@
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+
+class QuotaExceededError(RuntimeError):
+    pass
+
+
+class RequestScheduler:
+    # Gate in front of outgoing requests.
+    #
+    # A token bucket limits the request rate (rate tokens per second, up to
+    # burst saved up), and max_concurrent caps requests in flight. Callers
+    # wait in priority order - lower numbers first, then first come first
+    # served - so interactive lookups overtake queued background work. Either
+    # limit can be None to disable it.
+
+    def __init__(self, rate=None, burst=1, max_concurrent=None):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_concurrent = max_concurrent
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._active = 0
+        self._waiting = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def _wait_time(self, ticket):
+        # Seconds until ticket may go, 0 if it can go now, None if it has to
+        # wait for another request to finish or to go first
+        if self._waiting[0] != ticket:
+            return None
+        if self.max_concurrent is not None and self._active >= self.max_concurrent:
+            return None
+        if not self.rate:
+            return 0
+        self._refill()
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, priority=0):
+        with self._condition:
+            ticket = (priority, next(self._counter))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait_time = self._wait_time(ticket)
+                    if wait_time == 0:
+                        break
+                    self._condition.wait(wait_time)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+
+            heapq.heappop(self._waiting)
+            if self.rate:
+                self._tokens -= 1
+            self._active += 1
+            # Let the next caller in line check its turn
+            self._condition.notify_all()
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority=0):
+        self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class MonthlyQuota:
+    # Persistent count of requests made this calendar month (UTC), checked
+    # against a monthly budget.
+    #
+    # Each month is counted in its own file under quota_dir. Usage is added
+    # to the file in small batches (every FLUSH_INTERVAL requests and on
+    # flush()), re-reading it first so several processes sharing the budget
+    # add up instead of overwriting each other. The last `reserve` requests
+    # of the budget are kept for callers that pass use_reserve=True.
+
+    FLUSH_INTERVAL = 10
+
+    def __init__(self, quota_dir, budget, reserve=0):
+        self.quota_dir = quota_dir
+        self.budget = budget
+        self.reserve = reserve
+        self._month = None
+        self._stored = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _path_for(self, month):
+        return os.path.join(self.quota_dir, f"{month}.json")
+
+    def _read(self, month):
+        try:
+            with open(self._path_for(month), "r", encoding="utf-8") as f:
+                return int(json.load(f).get("requests", 0))
+        except (OSError, ValueError, AttributeError):
+            return 0
+
+    def _sync(self):
+        # Reload the count at the start of every month, then keep it current
+        month = datetime.now(timezone.utc).strftime("%Y-%m")
+        if month != self._month:
+            self._flush()
+            self._month = month
+            self._stored = self._read(month)
+            self._pending = 0
+
+    def _flush(self):
+        if not self._pending or self._month is None:
+            return
+
+        import tempfile
+
+        total = self._read(self._month) + self._pending
+        entry = {"month": self._month, "requests": total}
+
+        try:
+            os.makedirs(self.quota_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.quota_dir, suffix=".tmp")
+        except OSError:
+            # Keep counting in memory and try again on the next flush
+            return
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path_for(self._month))
+        except BaseException as e:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            if not isinstance(e, OSError):
+                raise
+            return
+
+        self._stored = total
+        self._pending = 0
+
+    def used(self):
+        with self._lock:
+            self._sync()
+            return self._stored + self._pending
+
+    def remaining(self):
+        return max(self.budget - self.used(), 0)
+
+    def is_low(self):
+        # True once only the reserve is left
+        return self.remaining() <= self.reserve
+
+    def consume(self, use_reserve=False):
+        # Count one request, or raise if the budget does not allow it
+        with self._lock:
+            self._sync()
+            floor = 0 if use_reserve else self.reserve
+            if self.budget - (self._stored + self._pending) <= floor:
+                raise QuotaExceededError(
+                    f"monthly request budget of {self.budget} is used up"
+                    + ("" if use_reserve else f" (keeping {self.reserve} in reserve)")
+                )
+            self._pending += 1
+            if self._pending >= self.FLUSH_INTERVAL:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+
+class ApiKeyPool:
+    # Spreads requests over several API keys.
+    #
+    # Keys are handed out round-robin. A key that the API rejects or
+    # throttles is ejected for a while and skipped; if every key is ejected,
+    # the one due back first is used rather than failing outright. Requests
+    # and ejections are counted per key.
+
+    def __init__(self, keys):
+        self.keys = list(dict.fromkeys(keys))
+        if not self.keys:
+            raise ValueError("at least one API key is required")
+        self._next = 0
+        self._ejected_until = dict.fromkeys(self.keys, 0.0)
+        self._usage = {
+            key: {"requests": 0, "ejections": 0, "last_status": None}
+            for key in self.keys
+        }
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            count = len(self.keys)
+            for offset in range(count):
+                index = (self._next + offset) % count
+                key = self.keys[index]
+                if self._ejected_until[key] <= now:
+                    self._next = (index + 1) % count
+                    break
+            else:
+                # Every key is ejected - take the least recently throttled
+                key = min(self.keys, key=self._ejected_until.get)
+            self._usage[key]["requests"] += 1
+            return key
+
+    def eject(self, key, seconds, status=None):
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._ejected_until[key] = max(self._ejected_until[key], until)
+            self._usage[key]["ejections"] += 1
+            self._usage[key]["last_status"] = status
+
+    def available(self):
+        now = time.monotonic()
+        with self._lock:
+            return sum(until <= now for until in self._ejected_until.values())
+
+    def usage(self):
+        # Per-key counters, in the order the keys were given
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": key,
+                    **self._usage[key],
+                    "ejected_for": max(round(self._ejected_until[key] - now), 0),
+                }
+                for key in self.keys
+            ]
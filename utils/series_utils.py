@@ -0,0 +1,81 @@
+from array import array
+from bisect import bisect_left
+
+# Block characters from lowest to highest
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+# Columns at least this long are reduced with NumPy when it is installed.
+# Shorter ones are faster with the stdlib than NumPy's import and call cost.
+NUMPY_MIN_SIZE = 4096
+
+_numpy = None
+
+
+def get_numpy():
+    # NumPy is optional - import it on first use, False if it is missing
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+def to_column(values):
+    # Pack a sequence of numbers into a compact float column
+    return array("d", values)
+
+
+def downsample(column, width, how="mean"):
+    # Split column into width buckets of (nearly) equal size and reduce each
+    # one to its mean or max. Columns that already fit are returned as is.
+    count = len(column)
+    if count <= width:
+        return list(column)
+
+    numpy = get_numpy() if count >= NUMPY_MIN_SIZE else None
+    if numpy:
+        values = numpy.frombuffer(column, dtype=float)
+        starts = numpy.arange(width) * count // width
+        if how == "max":
+            return numpy.maximum.reduceat(values, starts).tolist()
+        sizes = numpy.diff(numpy.append(starts, count))
+        return (numpy.add.reduceat(values, starts) / sizes).tolist()
+
+    # Each bucket is reduced by a C-level builtin over an array slice
+    edges = [index * count // width for index in range(width + 1)]
+    if how == "max":
+        return [max(column[start:end]) for start, end in zip(edges, edges[1:])]
+    return [
+        sum(column[start:end]) / (end - start) for start, end in zip(edges, edges[1:])
+    ]
+
+
+def bucketize(column, limits):
+    # Index of the first of the sorted limits each value is at or below, or
+    # len(limits) for values above all of them
+    count = len(column)
+    numpy = get_numpy() if count >= NUMPY_MIN_SIZE else None
+    if numpy:
+        values = numpy.frombuffer(column, dtype=float)
+        return numpy.searchsorted(limits, values, side="left").tolist()
+    return [bisect_left(limits, value) for value in column]
+
+
+def sparkline(values, low=None, high=None):
+    # Map each value onto a block character between low and high
+    if not values:
+        return ""
+    low = min(values) if low is None else low
+    high = max(values) if high is None else high
+    if high <= low:
+        return SPARK_CHARS[0] * len(values)
+
+    top = len(SPARK_CHARS) - 1
+    scale = top / (high - low)
+    return "".join(
+        SPARK_CHARS[min(max(round((value - low) * scale), 0), top)] for value in values
+    )
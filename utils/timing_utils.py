@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Timings:
+    # Thread-safe totals of named phases and counters for one process.
+    #
+    # Each phase keeps its call count, total and longest duration, measured
+    # with perf_counter_ns. Counters are plain running sums, e.g. bytes
+    # received or cache hits. Names are dotted, like "request.current".
+
+    def __init__(self):
+        # name -> [calls, total_ns, max_ns]
+        self._phases = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, elapsed_ns):
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is None:
+                self._phases[name] = [1, elapsed_ns, elapsed_ns]
+            else:
+                phase[0] += 1
+                phase[1] += elapsed_ns
+                phase[2] = max(phase[2], elapsed_ns)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def _copy(self):
+        with self._lock:
+            phases = {name: list(phase) for name, phase in self._phases.items()}
+            counters = dict(self._counters)
+        return dict(sorted(phases.items())), dict(sorted(counters.items()))
+
+    def snapshot(self):
+        phases, counters = self._copy()
+        return {
+            "phases": {
+                name: {
+                    "calls": calls,
+                    "total_ms": round(total_ns / 1e6, 3),
+                    "mean_ms": round(total_ns / calls / 1e6, 3),
+                    "max_ms": round(max_ns / 1e6, 3),
+                }
+                for name, (calls, total_ns, max_ns) in phases.items()
+            },
+            "counters": counters,
+        }
+
+    # -------------------------------------------------------------------------
+    # Output formats
+    # -------------------------------------------------------------------------
+    def format_text(self):
+        snapshot = self.snapshot()
+        lines = [
+            f"{'phase':<24}{'calls':>7}{'total ms':>12}{'mean ms':>11}{'max ms':>11}"
+        ]
+        for name, phase in snapshot["phases"].items():
+            lines.append(
+                f"{name:<24}{phase['calls']:>7}{phase['total_ms']:>12.3f}"
+                f"{phase['mean_ms']:>11.3f}{phase['max_ms']:>11.3f}"
+            )
+        for name, value in snapshot["counters"].items():
+            lines.append(f"{name:<24}{value:>7}")
+        return "\n".join(lines) + "\n"
+
+    def format_json(self):
+        return json.dumps(self.snapshot(), indent=2) + "\n"
+
+    def format_prometheus(self, prefix):
+        # Text exposition format, one labeled series per phase and counter
+        phases, counters = self._copy()
+        lines = [
+            f"# HELP {prefix}_phase_seconds_total Time spent in each phase.",
+            f"# TYPE {prefix}_phase_seconds_total counter",
+        ]
+        for name, (_, total_ns, _) in phases.items():
+            lines.append(
+                f'{prefix}_phase_seconds_total{{phase="{name}"}} {total_ns / 1e9}'
+            )
+        lines += [
+            f"# HELP {prefix}_phase_calls_total Times each phase ran.",
+            f"# TYPE {prefix}_phase_calls_total counter",
+        ]
+        for name, (calls, _, _) in phases.items():
+            lines.append(f'{prefix}_phase_calls_total{{phase="{name}"}} {calls}')
+        lines += [
+            f"# HELP {prefix}_phase_max_seconds Longest single run of each phase.",
+            f"# TYPE {prefix}_phase_max_seconds gauge",
+        ]
+        for name, (_, _, max_ns) in phases.items():
+            lines.append(f'{prefix}_phase_max_seconds{{phase="{name}"}} {max_ns / 1e9}')
+        lines += [
+            f"# HELP {prefix}_events_total Counted events, e.g. bytes or cache hits.",
+            f"# TYPE {prefix}_events_total counter",
+        ]
+        for name, value in counters.items():
+            lines.append(f'{prefix}_events_total{{event="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def format(self, output_format, prefix="app"):
+        if output_format == "json":
+            return self.format_json()
+        if output_format == "prometheus":
+            return self.format_prometheus(prefix)
+        return self.format_text()
+
+
+class TimedCache:
+    # Wraps a cache with get/put (ResponseCache or MemoryCache) to time
+    # lookups and writes and count hits and misses in a Timings.
+
+    def __init__(self, cache, timings, name="cache"):
+        self._cache = cache
+        self._timings = timings
+        self._name = name
+
+    def __getattr__(self, attribute):
+        return getattr(self._cache, attribute)
+
+    def get(self, key, *args, **kwargs):
+        with self._timings.phase(f"{self._name}.get"):
+            data = self._cache.get(key, *args, **kwargs)
+        self._timings.count(f"{self._name}.{'miss' if data is None else 'hit'}")
+        return data
+
+    def get_entry(self, key):
+        with self._timings.phase(f"{self._name}.get"):
+            entry = self._cache.get_entry(key)
+        outcome = "miss" if entry is None else "hit"
+        self._timings.count(f"{self._name}.entry_{outcome}")
+        return entry
+
+    def put(self, key, data, expires_at):
+        with self._timings.phase(f"{self._name}.put"):
+            self._cache.put(key, data, expires_at)
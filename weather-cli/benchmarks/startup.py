@@ -0,0 +1,228 @@
+# =============================================================================
+# STARTUP BENCHMARK
+# Measures cold-start time of a cached one-shot lookup and checks it against
+# a time budget. Runs fully offline: the cache is seeded with a sample
+# response, so no API key or network access is needed.
+#
+# Usage: python weather-cli/benchmarks/startup.py [--runs N] [--budget-ms MS]
+# =============================================================================
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# =============================================================================
+# PATHS
+# =============================================================================
+CLI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROOT_DIR = os.path.dirname(CLI_DIR)
+MAIN_SCRIPT = os.path.join(CLI_DIR, "main.py")
+
+sys.path.insert(0, CLI_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from utils.cache_utils import ResponseCache  # noqa: E402
+
+# =============================================================================
+# BENCHMARK SETTINGS
+# =============================================================================
+# Budget for a cached lookup on top of a bare interpreter start
+DEFAULT_BUDGET_MS = 40
+
+# Modules that must not be imported when the answer comes from the cache
+FORBIDDEN_MODULES = (
+    "requests",
+    "urllib3",
+    "concurrent.futures",
+    "asyncio",
+    "sqlite3",
+)
+
+SAMPLE_LOCATION = "Benchmark City"
+
+SAMPLE_WEATHER = {
+    "location": {
+        "name": SAMPLE_LOCATION,
+        "region": "Region",
+        "country": "Country",
+        "tz_id": "Europe/London",
+    },
+    "current": {
+        "last_updated_epoch": 0,
+        "last_updated": "2025-01-01 12:00",
+        "temp_c": 12.0,
+        "temp_f": 53.6,
+        "condition": {"text": "Partly cloudy", "code": 1003},
+        "wind_mph": 8.1,
+        "wind_kph": 13.0,
+        "wind_degree": 230,
+        "wind_dir": "SW",
+        "pressure_mb": 1015.0,
+        "humidity": 71,
+        "feelslike_c": 10.9,
+        "feelslike_f": 51.6,
+        "vis_miles": 6.0,
+        "uv": 2.0,
+        "air_quality": {"us-epa-index": 1},
+    },
+}
+
+SAMPLE_ASTRONOMY = {
+    "location": SAMPLE_WEATHER["location"],
+    "astronomy": {"astro": {"moon_phase": "Waxing Gibbous", "is_sun_up": 1}},
+}
+
+
+# =============================================================================
+# SEED CACHE
+# Function to store the sample responses where main.py will look for them
+# =============================================================================
+def seed_cache(cache_dir):
+    import main
+
+    cache = ResponseCache(cache_dir)
+    current_entry, astronomy_entry = main.get_cache_entries(
+        SAMPLE_LOCATION, datetime.now(), current_ttl=3600
+    )
+    cache.put(current_entry[0], SAMPLE_WEATHER, current_entry[1])
+    cache.put(astronomy_entry[0], SAMPLE_ASTRONOMY, astronomy_entry[1])
+
+
+# =============================================================================
+# RUN LOOKUP
+# Function to run one cached lookup in a fresh interpreter
+# =============================================================================
+def run_lookup(work_dir, cache_dir, extra_args=()):
+    command = [
+        sys.executable,
+        *extra_args,
+        MAIN_SCRIPT,
+        SAMPLE_LOCATION,
+        "--cache-dir",
+        cache_dir,
+    ]
+    start = time.perf_counter()
+    result = subprocess.run(command, cwd=work_dir, capture_output=True, text=True)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+
+    if result.returncode != 0:
+        raise RuntimeError(f"lookup failed: {result.stdout}{result.stderr}")
+    return elapsed_ms, result.stderr
+
+
+# =============================================================================
+# RUN BASELINE
+# Function to time a bare interpreter start for comparison
+# =============================================================================
+def run_baseline():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+# =============================================================================
+# PARSE IMPORT TIMES
+# Function to read -X importtime output into {module: cumulative microseconds}
+# for every module, plus the top-level imports made by main.py itself
+# =============================================================================
+def parse_import_times(stderr):
+    import_times = {}
+    top_level = {}
+    after_site = False
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, raw_module = line[len("import time:") :].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        module = raw_module.strip()
+        import_times[module] = int(cumulative)
+        # Interpreter startup ends with site, everything after is main.py's.
+        # Top-level entries have a single space of indentation.
+        if module == "site":
+            after_site = True
+        elif after_site and not raw_module.startswith("  "):
+            top_level[module] = int(cumulative)
+    return import_times, top_level
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Weather CLI startup benchmark")
+    parser.add_argument("--runs", type=int, default=20, help="Number of timed runs")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        default=DEFAULT_BUDGET_MS,
+        help="Fail if the lookup takes longer than a bare interpreter start by more "
+        f"than this (default: {DEFAULT_BUDGET_MS})",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        cache_dir = os.path.join(work_dir, "cache")
+        with open(os.path.join(work_dir, ".env"), "w") as f:
+            f.write("WEATHER_API_KEY=benchmark\n")
+        seed_cache(cache_dir)
+
+        # Warm the OS file cache and bytecode caches before timing
+        run_lookup(work_dir, cache_dir)
+        run_baseline()
+        timings = [run_lookup(work_dir, cache_dir)[0] for _ in range(args.runs)]
+        baselines = [run_baseline() for _ in range(args.runs)]
+
+        # One extra run to see which modules were imported and what they cost
+        _, stderr = run_lookup(work_dir, cache_dir, ["-X", "importtime"])
+        import_times, top_level = parse_import_times(stderr)
+
+    forbidden = [name for name in FORBIDDEN_MODULES if name in import_times]
+    median_ms = statistics.median(timings)
+    baseline_ms = statistics.median(baselines)
+    overhead_ms = median_ms - baseline_ms
+    results = {
+        "runs": args.runs,
+        "median_ms": round(median_ms, 2),
+        "min_ms": round(min(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "interpreter_ms": round(baseline_ms, 2),
+        "overhead_ms": round(overhead_ms, 2),
+        "budget_ms": args.budget_ms,
+        "import_ms": round(sum(top_level.values()) / 1000, 2),
+        "imports_ms": {
+            module: round(microseconds / 1000, 2)
+            for module, microseconds in sorted(
+                top_level.items(), key=lambda item: -item[1]
+            )
+        },
+        "forbidden_imports": forbidden,
+    }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"Cached lookup over {args.runs} runs:")
+        print(f"  median {results['median_ms']} ms")
+        print(f"  min {results['min_ms']} ms, max {results['max_ms']} ms")
+        print(f"  bare interpreter {results['interpreter_ms']} ms")
+        print(f"  overhead {results['overhead_ms']} ms (budget {args.budget_ms} ms)")
+        print(f"  imports made by main.py: {results['import_ms']} ms")
+        for module, milliseconds in list(results["imports_ms"].items())[:10]:
+            print(f"    {milliseconds:8.2f} ms  {module}")
+        if forbidden:
+            print(f"  unexpected imports: {', '.join(forbidden)}")
+
+    # Exit with error code when over budget so CI can track it
+    if forbidden or overhead_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+# =============================================================================
+# BENCHMARK SUITE
+# Times the fetch, decode and render hot paths and batch throughput, fully
+# offline. API calls go to a local ReplayServer serving the recorded payloads
+# in benchmarks/fixtures, so numbers are comparable from run to run.
+#
+# Results are printed to stdout as JSON (one entry per benchmark) and a short
+# summary goes to stderr.
+#
+# Usage: python weather-cli/benchmarks/suite.py [--quick] [--output FILE]
+# =============================================================================
+import argparse
+import copy
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+# =============================================================================
+# PATHS
+# =============================================================================
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLI_DIR = os.path.dirname(BENCH_DIR)
+ROOT_DIR = os.path.dirname(CLI_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+sys.path.insert(0, CLI_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import main  # noqa: E402
+from replay import ReplayServer  # noqa: E402
+
+# =============================================================================
+# BENCHMARK SETTINGS
+# =============================================================================
+BATCH_SIZES = (1, 10, 100, 1000)
+
+# Name of the recorded location every synthetic location is copied from
+FIXTURE_LOCATION = "london"
+
+# Every recorded endpoint
+FIXTURE_ENDPOINTS = ("current", "astronomy", "forecast")
+
+# Rows in the table rendering benchmark, the size of a large ops wall
+TABLE_ROWS = 500
+
+
+# =============================================================================
+# TIME CALL
+# Function to run func repeatedly and summarize the per-call time
+# =============================================================================
+def time_call(func, iterations):
+    # One untimed call to warm caches and lazy imports
+    func()
+
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        func()
+        samples.append(time.perf_counter_ns() - start)
+
+    return {
+        "iterations": iterations,
+        "mean_us": round(statistics.mean(samples) / 1000, 2),
+        "median_us": round(statistics.median(samples) / 1000, 2),
+        "min_us": round(min(samples) / 1000, 2),
+        "max_us": round(max(samples) / 1000, 2),
+    }
+
+
+# =============================================================================
+# LOAD FIXTURE
+# Function to read a recorded payload as raw bytes
+# =============================================================================
+def load_fixture(endpoint, location=FIXTURE_LOCATION):
+    with open(os.path.join(FIXTURES_DIR, endpoint, f"{location}.json"), "rb") as f:
+        return f.read()
+
+
+# =============================================================================
+# MAKE BATCH FIXTURES
+# Function to copy the recorded payloads, plus copies under many synthetic
+# location names so the replay server can answer a large batch
+# =============================================================================
+def make_batch_fixtures(directory, count):
+    shutil.copytree(FIXTURES_DIR, directory, dirs_exist_ok=True)
+
+    locations = [f"location-{index:04d}" for index in range(count)]
+    for endpoint in FIXTURE_ENDPOINTS:
+        source = os.path.join(FIXTURES_DIR, endpoint, f"{FIXTURE_LOCATION}.json")
+        for location in locations:
+            shutil.copyfile(
+                source, os.path.join(directory, endpoint, f"{location}.json")
+            )
+    return locations
+
+
+# =============================================================================
+# RENDER CASES
+# Function to build one combined payload per condition code (day and night)
+# and per moon phase, covering every logo the renderer can pick
+# =============================================================================
+def build_render_cases():
+    weather_data = main.project_current_response(json.loads(load_fixture("current")))
+    astronomy_data = main.project_astronomy_response(
+        json.loads(load_fixture("astronomy"))
+    )
+
+    def make_case(code, is_day, moon_phase=None):
+        weather = copy.deepcopy(weather_data)
+        astronomy = copy.deepcopy(astronomy_data)
+        weather["current"]["condition"]["code"] = code
+        weather["current"]["is_day"] = is_day
+        # Without sunrise and sunset the renderer goes by is_day
+        astronomy["astronomy"]["astro"].pop("sunrise", None)
+        astronomy["astronomy"]["astro"].pop("sunset", None)
+        if moon_phase is not None:
+            astronomy["astronomy"]["astro"]["moon_phase"] = moon_phase
+        return main.combine_weather_data(weather, astronomy)
+
+    cases = [
+        make_case(code, is_day) for code in main.WEATHER_ICONS for is_day in (1, 0)
+    ]
+    cases.extend(make_case(1000, 0, moon_phase) for moon_phase in main.MOON_PHASE_ASCII)
+    return cases
+
+
+# =============================================================================
+# BENCHMARKS
+# =============================================================================
+def bench_decode(iterations):
+    results = []
+    for endpoint in FIXTURE_ENDPOINTS:
+        body = load_fixture(endpoint)
+        stats = time_call(lambda: json.loads(body), iterations)
+        results.append({"name": f"decode.{endpoint}", "bytes": len(body), **stats})
+
+    # Decoding plus projection down to a report, as the fetch path does it
+    current_body = load_fixture("current")
+    astronomy_body = load_fixture("astronomy")
+    forecast_body = load_fixture("forecast")
+    projections = {
+        "split": lambda: main.combine_weather_data(
+            main.project_current_response(json.loads(current_body)),
+            main.project_astronomy_response(json.loads(astronomy_body)),
+        ),
+        "forecast": lambda: main.combine_weather_data(
+            *main.normalize_forecast_data(json.loads(forecast_body))
+        ),
+    }
+    for strategy, project in projections.items():
+        stats = time_call(project, iterations)
+        results.append({"name": f"decode.report.{strategy}", **stats})
+    return results
+
+
+def bench_render(iterations):
+    cases = build_render_cases()
+
+    def render_all():
+        for data in cases:
+            main.render_weather(data)
+
+    stats = time_call(render_all, iterations)
+    per_panel_us = round(stats["median_us"] / len(cases), 2)
+    results = [
+        {
+            "name": "render.all_conditions",
+            "panels": len(cases),
+            "per_panel_us": per_panel_us,
+            "color": main.USE_COLOR,
+            **stats,
+        }
+    ]
+
+    # One table with every case repeated up to TABLE_ROWS rows
+    rows = [cases[index % len(cases)] for index in range(TABLE_ROWS)]
+    stats = time_call(lambda: main.render_table(rows, width=120), iterations)
+    results.append(
+        {
+            "name": f"render.table_{TABLE_ROWS}",
+            "rows": TABLE_ROWS,
+            "per_row_us": round(stats["median_us"] / TABLE_ROWS, 2),
+            "color": main.USE_COLOR,
+            **stats,
+        }
+    )
+    return results
+
+
+def bench_get_weather(iterations):
+    results = []
+    for strategy in main.FETCH_STRATEGIES:
+        stats = time_call(
+            lambda: main.get_weather("bench", "London", strategy=strategy),
+            iterations,
+        )
+        results.append({"name": f"get_weather.{strategy}", **stats})
+    return results
+
+
+def bench_batch(locations, sizes, workers, strategy):
+    results = []
+    for size in sizes:
+        batch = locations[:size]
+        start = time.perf_counter()
+        failures = sum(
+            error is not None
+            for _, _, error in main.get_weather_batch(
+                "bench", batch, workers, strategy=strategy
+            )
+        )
+        elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "name": f"batch.{size}",
+                "locations": size,
+                "workers": workers,
+                "strategy": strategy,
+                "failures": failures,
+                "seconds": round(elapsed, 4),
+                "locations_per_second": round(size / elapsed, 1),
+            }
+        )
+    return results
+
+
+# =============================================================================
+# GIT REVISION
+# Function to tag results with the commit they were measured on
+# =============================================================================
+def get_git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =============================================================================
+# MAIN
+# =============================================================================
+def main_benchmarks():
+    parser = argparse.ArgumentParser(description="Weather CLI benchmark suite")
+    parser.add_argument(
+        "--iterations", type=int, default=200, help="Timed calls per micro benchmark"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=list(BATCH_SIZES),
+        help=f"Batch sizes to measure (default: {' '.join(map(str, BATCH_SIZES))})",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.01,
+        help="Simulated network latency per replayed request in seconds",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=main.DEFAULT_WORKERS,
+        help="Worker threads for the batch benchmarks",
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=main.FETCH_STRATEGIES,
+        default=main.DEFAULT_FETCH_STRATEGY,
+        help="Fetch strategy for the batch benchmarks",
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Fewer iterations and smaller batches"
+    )
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.iterations = min(args.iterations, 20)
+        args.sizes = [size for size in args.sizes if size <= 100]
+
+    results = []
+    results.extend(bench_decode(args.iterations))
+    results.extend(bench_render(args.iterations))
+
+    with tempfile.TemporaryDirectory() as fixtures_dir:
+        locations = make_batch_fixtures(fixtures_dir, max(args.sizes))
+
+        # End to end fetches without simulated latency, to isolate our overhead
+        server = ReplayServer(fixtures_dir).start()
+        main.API_BASE_URL = server.base_url
+        main.HTTP_SETTINGS["pool_size"] = max(args.workers, main.DEFAULT_WORKERS)
+        try:
+            results.extend(bench_get_weather(max(args.iterations // 10, 5)))
+
+            server.latency = args.latency
+            results.extend(
+                bench_batch(locations, args.sizes, args.workers, args.strategy)
+            )
+        finally:
+            server.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": get_git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency_s": args.latency,
+        },
+        "results": results,
+    }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    # Short human readable summary
+    for result in results:
+        if "median_us" in result:
+            summary = f"{result['median_us']:>10.2f} us median"
+        else:
+            summary = f"{result['locations_per_second']:>10.1f} locations/s"
+        print(f"{result['name']:<28}{summary}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main_benchmarks()
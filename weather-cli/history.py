@@ -0,0 +1,209 @@
+# =============================================================================
+# OBSERVATION HISTORY
+# Append-only SQLite store of every current-conditions response fetched, so
+# trends can be read locally instead of re-polling the API.
+#
+# One row per (location, last_updated_epoch): the API only publishes a new
+# observation every 15 minutes or so, and repeated fetches of the same one
+# are skipped. Rows are written in batches, in WAL mode so readers never
+# block the CLI and several processes can share one database.
+# =============================================================================
+import os
+import sqlite3
+import threading
+import time
+
+# =============================================================================
+# HISTORY SETTINGS
+# =============================================================================
+# Observations collected before they are written in one transaction
+BATCH_SIZE = 100
+
+# Seconds an observation may wait in memory before the batch is written
+FLUSH_INTERVAL = 60
+
+# Fields copied from the projected location and current conditions
+LOCATION_COLUMNS = ("name", "region", "country")
+CURRENT_COLUMNS = (
+    "temp_c",
+    "temp_f",
+    "feelslike_c",
+    "feelslike_f",
+    "humidity",
+    "pressure_mb",
+    "wind_kph",
+    "wind_mph",
+    "wind_degree",
+    "uv",
+    "vis_miles",
+)
+COLUMNS = (
+    "location",
+    "last_updated_epoch",
+    *LOCATION_COLUMNS,
+    *CURRENT_COLUMNS,
+    "aqi",
+    "condition_code",
+)
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS observations (
+    location TEXT NOT NULL,
+    last_updated_epoch INTEGER NOT NULL,
+    {", ".join(f"{column} TEXT" for column in LOCATION_COLUMNS)},
+    {", ".join(f"{column} REAL" for column in CURRENT_COLUMNS)},
+    aqi INTEGER,
+    condition_code INTEGER,
+    PRIMARY KEY (location, last_updated_epoch)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS observations_by_name
+    ON observations (name COLLATE NOCASE, last_updated_epoch);
+"""
+
+
+# =============================================================================
+# HISTORY STORE
+# Batched writer and summary queries over the observations table
+# =============================================================================
+class HistoryStore:
+    def __init__(self, path):
+        self.path = path
+        self._pending = []
+        self._pending_since = None
+        # Last observation queued per location, to skip repeats before SQLite
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def _connect(self):
+        if self._connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+    def add(self, location, weather_data):
+        # Queue one projected current-conditions response under location
+        current = weather_data.get("current", {})
+        last_updated = current.get("last_updated_epoch")
+        if last_updated is None:
+            return
+
+        place = weather_data.get("location", {})
+        row = (
+            location,
+            last_updated,
+            *(place.get(column) for column in LOCATION_COLUMNS),
+            *(current.get(column) for column in CURRENT_COLUMNS),
+            current.get("air_quality", {}).get("us-epa-index"),
+            current.get("condition", {}).get("code"),
+        )
+
+        with self._lock:
+            if self._last_seen.get(location) == last_updated:
+                return
+            self._last_seen[location] = last_updated
+            self._pending.append(row)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+            due = (
+                len(self._pending) >= BATCH_SIZE
+                or time.monotonic() - self._pending_since >= FLUSH_INTERVAL
+            )
+            if due:
+                self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        rows, self._pending, self._pending_since = self._pending, [], None
+
+        connection = self._connect()
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with connection:
+            # Rows already stored by an earlier run are skipped
+            connection.executemany(
+                f"INSERT OR IGNORE INTO observations ({', '.join(COLUMNS)}) "
+                f"VALUES ({placeholders})",
+                rows,
+            )
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            try:
+                self._flush()
+            finally:
+                if self._connection is not None:
+                    self._connection.close()
+                    self._connection = None
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+    def summarize(self, location, name, start, end, metrics):
+        # Min, max and average of each metric column between two epochs, for
+        # rows stored under location or, failing that, under a place name
+        self.flush()
+        connection = self._connect()
+
+        aggregates = ", ".join(
+            f"MIN({column}), MAX({column}), AVG({column}), COUNT({column})"
+            for column in metrics
+        )
+        query = (
+            f"SELECT COUNT(*), MIN(last_updated_epoch), MAX(last_updated_epoch), "
+            f"MIN(name), MIN(region), MIN(country), {aggregates} "
+            f"FROM observations WHERE {{}} "
+            f"AND last_updated_epoch >= ? AND last_updated_epoch < ?"
+        )
+
+        row = connection.execute(
+            query.format("location = ?"), (location, start, end)
+        ).fetchone()
+        if not row[0] and name:
+            row = connection.execute(
+                query.format("name = ? COLLATE NOCASE"), (name, start, end)
+            ).fetchone()
+
+        count, first, last, place_name, region, country = row[:6]
+        values = row[6:]
+        return {
+            "count": count,
+            "first": first,
+            "last": last,
+            "name": place_name,
+            "region": region,
+            "country": country,
+            "metrics": {
+                column: values[index * 4 : index * 4 + 4]
+                for index, column in enumerate(metrics)
+            },
+        }
+
+    def series(self, location, start, end, columns):
+        # Column lists of the observations for location between two epochs,
+        # oldest first, including a "last_updated_epoch" column
+        self.flush()
+        connection = self._connect()
+        rows = connection.execute(
+            f"SELECT last_updated_epoch, {', '.join(columns)} FROM observations "
+            f"WHERE location = ? AND last_updated_epoch >= ? "
+            f"AND last_updated_epoch < ? ORDER BY last_updated_epoch",
+            (location, start, end),
+        ).fetchall()
+
+        # Transpose rows into columns in one pass
+        values = list(zip(*rows)) or [()] * (len(columns) + 1)
+        return dict(zip(("last_updated_epoch", *columns), map(list, values)))
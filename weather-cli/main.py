@@ -1,48 +1,260 @@
 # =============================================================================
 # IMPORTS
+# Heavier modules (requests, colorama, concurrent.futures, asyncio) are
+# imported where they are first needed to keep CLI startup fast
 # =============================================================================
 import argparse
+import functools
+import json
 import os
+import re
 import sys
-from datetime import datetime
-
-import colorama
-import requests
-from colorama import Fore, Style
+import threading
+import time
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
 
 # Add root directory to path for importing utils
 root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(root_dir)
 
 
-from utils.env_utils import get_api_key  # noqa: E402
+from utils.cache_utils import (  # noqa: E402
+    MemoryCache,
+    ResponseCache,
+    get_default_cache_dir,
+    get_default_data_dir,
+)
+from utils.env_utils import get_api_keys  # noqa: E402
+from utils.error_utils import describe_error  # noqa: E402
+
+# =============================================================================
+# API SETTINGS
+# =============================================================================
+API_BASE_URL = "https://api.weatherapi.com/v1"
+
+# .env file read for WEATHER_API_KEY when it is not set in the environment.
+# By default ./.env if it exists, else the one in the root directory.
+DEFAULT_ENV_FILE = os.environ.get("WEATHER_ENV_FILE")
+
+# Maximum number of requests in flight at once in batch mode
+DEFAULT_WORKERS = 8
+
+# "forecast" gets current conditions and astronomy from one forecast.json call,
+# "split" uses separate current.json and astronomy.json calls
+FETCH_STRATEGIES = ("forecast", "split")
+DEFAULT_FETCH_STRATEGY = os.environ.get("WEATHER_FETCH_STRATEGY", "forecast")
+
+# Default address for --serve
+DEFAULT_SERVE_HOST = os.environ.get("WEATHER_SERVE_HOST", "127.0.0.1")
+DEFAULT_SERVE_PORT = int(os.environ.get("WEATHER_SERVE_PORT", 8080))
+
+# =============================================================================
+# HTTP SETTINGS
+# Defaults can be overridden with environment variables or CLI flags
+# =============================================================================
+HTTP_SETTINGS = {
+    "connect_timeout": float(os.environ.get("WEATHER_CONNECT_TIMEOUT", 3.05)),
+    "read_timeout": float(os.environ.get("WEATHER_READ_TIMEOUT", 10)),
+    "retries": int(os.environ.get("WEATHER_HTTP_RETRIES", 3)),
+    "backoff": float(os.environ.get("WEATHER_HTTP_BACKOFF", 0.5)),
+    "pool_size": int(os.environ.get("WEATHER_HTTP_POOL_SIZE", DEFAULT_WORKERS)),
+}
+
+# Shared keep-alive session, created on first use
+_session = None
+_session_lock = threading.Lock()
+
+# Optional recorder that saves every raw API response (see --record)
+_recorder = None
+
+# =============================================================================
+# RATE LIMIT SETTINGS
+# Limits for the plan the API key is on. Unset limits are not enforced.
+# =============================================================================
+# Request priorities - lower numbers go first when requests are queued
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+RATE_LIMIT_SETTINGS = {
+    # Requests per second, and how many may be saved up for a burst
+    "rate": float(os.environ.get("WEATHER_RATE_LIMIT", 0)) or None,
+    "burst": int(os.environ.get("WEATHER_RATE_BURST", 1)),
+    "max_concurrent": int(os.environ.get("WEATHER_MAX_CONCURRENT", 0)) or None,
+    # Requests per calendar month, and the share of it kept for interactive
+    # lookups once batch work has used up the rest
+    "monthly_budget": int(os.environ.get("WEATHER_MONTHLY_BUDGET", 0)) or None,
+    "budget_reserve": float(os.environ.get("WEATHER_BUDGET_RESERVE", 0.05)),
+}
+
+# Request scheduler and monthly quota, set up in main() when limits are set.
+# The rate and budget are per API key, and scale with the number of keys.
+_scheduler = None
+_quota = None
+
+# =============================================================================
+# API KEY SETTINGS
+# Several keys (WEATHER_API_KEYS) are used in turn through a key pool
+# =============================================================================
+# Seconds a key sits out after the API rejects it (401/403) or throttles it
+# (429, unless the response says when to come back)
+KEY_REJECTED_SECONDS = 60 * 60
+KEY_THROTTLED_SECONDS = 60
+
+# 403 error code for a plan without access to the endpoint - not the key's fault
+ERROR_CODE_NO_ACCESS = 2009
+
+# Key pool, set up in main() when more than one key is given
+_key_pool = None
+
+# =============================================================================
+# TIMING SETTINGS
+# Per-phase timings and counters for --timings (env: WEATHER_TIMINGS)
+# =============================================================================
+TIMING_FORMATS = ("text", "json", "prometheus")
+
+# WEATHER_TIMINGS=1 turns on text timings, or it can name one of TIMING_FORMATS
+DEFAULT_TIMINGS = os.environ.get("WEATHER_TIMINGS", "").lower()
+if DEFAULT_TIMINGS in ("", "0", "false", "no"):
+    DEFAULT_TIMINGS = None
+elif DEFAULT_TIMINGS not in TIMING_FORMATS:
+    DEFAULT_TIMINGS = "text"
+
+# Prefix of every metric name in the Prometheus output
+METRICS_PREFIX = "weather_cli"
+
+# Timings collected for this run, set up in main() with --timings
+_timings = None
+
+# Shared no-op context for untimed runs
+UNTIMED = nullcontext()
+
 
 # =============================================================================
-# COLORAMA SETUP
+# TIMED
+# Function to time a block as the phase name when timings are on
 # =============================================================================
-# Initialize colorama for cross-platform colored terminal text
-colorama.init(autoreset=True)
+def timed(name):
+    return UNTIMED if _timings is None else _timings.phase(name)
+
+
+# =============================================================================
+# CACHE SETTINGS
+# =============================================================================
+# Current conditions only update every few minutes on the API side
+DEFAULT_CURRENT_TTL = int(os.environ.get("WEATHER_CACHE_TTL", 300))
+
+# Maximum number of cached responses kept on disk. The location index is
+# kept apart and not counted, and batches raise the limit to at least
+# CACHE_ENTRIES_PER_LOCATION per location so a run never evicts its own data.
+DEFAULT_CACHE_ENTRIES = int(os.environ.get("WEATHER_CACHE_ENTRIES", 1000))
+CACHE_ENTRIES_PER_LOCATION = 3
+
+# Cache key namespaces exempt from eviction
+PINNED_CACHE_KEYS = ("location",)
+
+# WeatherAPI refreshes current conditions roughly every 15 minutes
+CURRENT_UPDATE_INTERVAL = 15 * 60
+
+# Hourly forecasts for --trend only change a few times a day
+DEFAULT_TREND_TTL = 60 * 60
+
+# Most days forecast.json returns (and accepts as days=)
+MAX_FORECAST_DAYS = 14
+
+# Stale-while-revalidate: cached data up to revalidate_window seconds past
+# its TTL is shown at once and refreshed in the background. If the API
+# fails, or is slower than timeout seconds, data up to max_staleness seconds
+# past its TTL is shown instead. Stale data is marked with its age. Before
+# exiting, background refreshes get up to drain_timeout seconds to finish.
+STALE_SETTINGS = {
+    "revalidate_window": int(os.environ.get("WEATHER_STALE_WINDOW", 15 * 60)),
+    "max_staleness": int(os.environ.get("WEATHER_MAX_STALENESS", 6 * 60 * 60)),
+    "timeout": float(os.environ.get("WEATHER_STALE_TIMEOUT", 2)),
+    "drain_timeout": float(os.environ.get("WEATHER_STALE_DRAIN_TIMEOUT", 10)),
+}
+
+# Locations being refreshed in the background, by current conditions key
+_revalidating = set()
+_revalidating_lock = threading.Lock()
+
+# Fetches that may outlive the lookup that started them
+_background = set()
+
+# How long a query keeps resolving to the canonical location the API returned
+LOCATION_INDEX_TTL = 30 * 24 * 60 * 60
+
+# Decimal places coordinates are rounded to (about 1 km) when comparing places
+COORDINATE_PRECISION = 2
+
+DEFAULT_CACHE_DIR = os.environ.get("WEATHER_CACHE_DIR") or get_default_cache_dir(
+    "weather-cli"
+)
+
+# =============================================================================
+# HISTORY SETTINGS
+# =============================================================================
+DEFAULT_HISTORY_PATH = os.environ.get("WEATHER_HISTORY_DB") or os.path.join(
+    get_default_data_dir("weather-cli"), "history.sqlite3"
+)
+
+# Observation history, opened on the first fetch (see --no-history)
+_history_path = None
+_history = None
+_history_lock = threading.Lock()
+
+# Summary window for --history when --since is not given
+DEFAULT_HISTORY_WINDOW = 24 * 60 * 60
+
+# =============================================================================
+# COLOR SETUP
+# Colors are only used when writing to a terminal and NO_COLOR is not set.
+# Piped output skips colorama entirely, which keeps it plain text and avoids
+# the import at startup. Every colored string ends with its own reset code, so
+# output can be written straight to the raw stdout without colorama wrapping.
+# =============================================================================
+USE_COLOR = sys.stdout.isatty() and not os.environ.get("NO_COLOR")
 
 # ANSI color codes
-COLORS = {
-    "RED": Fore.RED,
-    "GREEN": Fore.GREEN,
-    "YELLOW": Fore.YELLOW,
-    "BLUE": Fore.BLUE,
-    "MAGENTA": Fore.MAGENTA,
-    "CYAN": Fore.CYAN,
-    "WHITE": Fore.WHITE,
-    "RESET": Style.RESET_ALL,
-    "BOLD": Style.BRIGHT,
+ANSI_CODES = {
+    "RED": "\033[31m",
+    "GREEN": "\033[32m",
+    "YELLOW": "\033[33m",
+    "BLUE": "\033[34m",
+    "MAGENTA": "\033[35m",
+    "CYAN": "\033[36m",
+    "WHITE": "\033[37m",
+    "RESET": "\033[0m",
+    "BOLD": "\033[1m",
+}
+
+# Color codes for each color mode, so rendering can be done either way
+PALETTES = {
+    True: ANSI_CODES,
+    False: {name: "" for name in ANSI_CODES},
+}
+
+if USE_COLOR:
+    import colorama
+
+    # Enable ANSI codes on Windows consoles without wrapping stdout
+    colorama.just_fix_windows_console()
+
+COLORS = PALETTES[USE_COLOR]
+
+# Logo color for each weather category
+WEATHER_COLOR_NAMES = {
+    "sunny": "YELLOW",
+    "cloudy": "WHITE",
+    "rainy": "CYAN",
+    "snowy": "WHITE",
+    "thunder": "MAGENTA",
+    "clear_night": "WHITE",
 }
 
 WEATHER_COLORS = {
-    "sunny": Fore.YELLOW,
-    "cloudy": Fore.WHITE,
-    "rainy": Fore.CYAN,
-    "snowy": Fore.WHITE,
-    "thunder": Fore.MAGENTA,
-    "clear_night": Fore.WHITE,
+    logo_type: COLORS[color_name]
+    for logo_type, color_name in WEATHER_COLOR_NAMES.items()
 }
 
 # =============================================================================
@@ -230,6 +442,23 @@ MOON_PHASE_ASCII = {
 }
 
 
+# =============================================================================
+# CONDITION CATEGORIES
+# Weather codes grouped by the ASCII art logo they are drawn with
+# =============================================================================
+CLOUDY_CODES = frozenset([1003, 1006, 1009, 1030, 1135, 1147])
+THUNDER_CODES = frozenset([1273, 1276, 1279, 1282])
+SNOW_CODES = frozenset(
+    [1210, 1213, 1216, 1219, 1222, 1225, 1237, 1255, 1258, 1261, 1264]
+)
+
+CONDITION_LOGOS = {
+    **{code: "cloudy" for code in CLOUDY_CODES},
+    **{code: "thunder" for code in THUNDER_CODES},
+    **{code: "snowy" for code in SNOW_CODES},
+}
+
+
 # =============================================================================
 # GET CONDITION LOGO
 # Function to map API weather codes to ASCII art categories
@@ -240,26 +469,8 @@ def get_logo_for_condition_code(code, is_day=True):
             return "sunny"  # Daytime clear -> sun
         else:
             return "clear_night"  # Nighttime clear -> moon
-    elif code in [1003, 1006, 1009, 1030, 1135, 1147]:  # Cloudy conditions
-        return "cloudy"
-    elif code in [1273, 1276, 1279, 1282]:  # Thunderstorms
-        return "thunder"
-    elif code in [
-        1210,
-        1213,
-        1216,
-        1219,
-        1222,
-        1225,
-        1237,
-        1255,
-        1258,
-        1261,
-        1264,
-    ]:  # Snow
-        return "snowy"
-    else:  # Default to rainy for all other precipitation
-        return "rainy"
+    # Default to rainy for all other precipitation
+    return CONDITION_LOGOS.get(code, "rainy")
 
 
 # =============================================================================
@@ -277,296 +488,3123 @@ def get_weather_icon(weather_code, is_daytime, moon_phase=""):
 
 
 # =============================================================================
-# GET WEATHER DATA
-# Function to fetch data from the weather API
+# BUILD REQUEST URLS
+# Function to build the current weather and astronomy URLs for a location
 # =============================================================================
-def get_weather(api_key, location):
+def build_request_urls(api_key, location, today=None):
     # Current weather request
-    weather_url = (
-        f"https://api.weatherapi.com/v1/current.json?key={api_key}&q={location}&aqi=yes"
-    )
+    weather_url = f"{API_BASE_URL}/current.json?key={api_key}&q={location}&aqi=yes"
 
     # Today's date for astronomy endpoint
-    today = datetime.now().strftime("%Y-%m-%d")
+    if today is None:
+        today = datetime.now().strftime("%Y-%m-%d")
 
     # Astronomy request (for sunrise, sunset, moon phase)
-    astronomy_url = f"https://api.weatherapi.com/v1/astronomy.json?key={api_key}&q={location}&dt={today}"
+    astronomy_url = (
+        f"{API_BASE_URL}/astronomy.json?key={api_key}&q={location}&dt={today}"
+    )
+
+    return weather_url, astronomy_url
 
-    try:
-        # Fetch current weather
-        weather_response = requests.get(weather_url)
-        weather_response.raise_for_status()
-        weather_data = weather_response.json()
 
-        # Fetch astronomy data
-        astronomy_response = requests.get(astronomy_url)
-        astronomy_response.raise_for_status()
-        astronomy_data = astronomy_response.json()
+# =============================================================================
+# BUILD FORECAST URL
+# Function to build the one-day forecast URL, which returns current conditions
+# and today's astronomy in a single response
+# =============================================================================
+def build_forecast_url(api_key, location, days=1):
+    return f"{API_BASE_URL}/forecast.json?key={api_key}&q={location}&days={days}&aqi=yes&alerts=no"
 
-        # Combine both datasets
-        combined_data = weather_data.copy()
-        combined_data["astronomy"] = astronomy_data.get("astronomy", {})
 
-        return combined_data
-    except Exception as e:
-        print(f"{COLORS['RED']}Error fetching weather data: {e}")
-        sys.exit(1)
+# =============================================================================
+# GET HTTP SESSION
+# Function to return the shared session so connections are reused across calls
+# =============================================================================
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            # Imported on first use - requests is the slowest part of startup
+            with timed("session"):
+                from utils.http_utils import (
+                    RETRY_STATUSES,
+                    SERVER_ERROR_STATUSES,
+                    create_session,
+                )
+
+                # With a key pool a 429 moves on to the next key rather than
+                # retrying (and sleeping) on the throttled one
+                _session = create_session(
+                    pool_size=HTTP_SETTINGS["pool_size"],
+                    retries=HTTP_SETTINGS["retries"],
+                    backoff_factor=HTTP_SETTINGS["backoff"],
+                    retry_statuses=(
+                        RETRY_STATUSES if _key_pool is None else SERVER_ERROR_STATUSES
+                    ),
+                )
+        return _session
 
 
 # =============================================================================
-# FORMAT TIME
-# Function to convert API timestamp to a more readable format
+# SEND REQUEST
+# Function to GET a URL through the shared session and request scheduler
 # =============================================================================
-def format_time(timestamp, format_str="%Y-%m-%d %H:%M"):
+def send_request(url, priority=PRIORITY_INTERACTIVE):
+    if _quota is not None:
+        # Every request sent counts, including retries with another key.
+        # Interactive lookups may dip into the reserve, batch work may not.
+        _quota.consume(use_reserve=priority == PRIORITY_INTERACTIVE)
+
+    timeout = (HTTP_SETTINGS["connect_timeout"], HTTP_SETTINGS["read_timeout"])
+    session = get_session()
+    if _timings is None:
+        request_timer = UNTIMED
+    else:
+        request_timer = _timings.phase(f"request.{get_endpoint(url)}")
+    if _scheduler is None:
+        with request_timer:
+            return session.get(url, timeout=timeout)
+
+    # Wait for a rate limit token and a free slot, in priority order
+    with timed("queue"):
+        _scheduler.acquire(priority)
     try:
-        # Parse the timestamp string into a datetime object
-        dt = datetime.strptime(timestamp, format_str)
-        # Format datetime into a more readable string
-        return dt.strftime("%A, %B %d, %Y at %I:%M %p")
-    except Exception:
-        # Return the original timestamp if parsing fails
-        return timestamp
+        with request_timer:
+            return session.get(url, timeout=timeout)
+    finally:
+        _scheduler.release()
 
 
 # =============================================================================
-# GET WIND DIRECTION ARROWS
-# Function to convert degrees to directional arrow
+# GET ENDPOINT
+# Function to name the API endpoint a URL calls, e.g. "current"
 # =============================================================================
-def get_wind_direction_arrow(degrees):
-    # Define the wind direction arrows (8 directions)
-    arrows = ["↑", "↗", "→", "↘", "↓", "↙", "←", "↖"]
-
-    # Convert degrees to one of 8 directions (divide by 45 degrees)
-    index = round(degrees / 45) % 8
-    return arrows[index]
+def get_endpoint(url):
+    endpoint = url.split("?", 1)[0].rsplit("/", 1)[-1]
+    return endpoint[: -len(".json")] if endpoint.endswith(".json") else endpoint
 
 
 # =============================================================================
-# DAYTIME CHECK
-# Function to check if it's daytime based on astronomy data
+# SEND REQUEST WITH KEY POOL
+# Function to send a request with the next key from the pool, moving on to
+# another key when one is rejected or throttled. The key already in the URL
+# is replaced. Returns the last response once every key has been tried.
 # =============================================================================
-def is_daytime(data):
-    if "astronomy" in data and "astro" in data["astronomy"]:
-        astro = data["astronomy"]["astro"]
-        if "is_sun_up" in astro:
-            return astro["is_sun_up"] == 1
+KEY_PARAM_PATTERN = re.compile(r"([?&]key=)[^&]*")
 
-    # Fallback to checking the current hour against general sunrise/sunset times
-    current_hour = datetime.now().hour
-    return 6 <= current_hour < 18  # Assume daytime is 6 AM to 6 PM if no data
+
+def send_request_with_key_pool(url, priority=PRIORITY_INTERACTIVE):
+    for _ in range(len(_key_pool)):
+        key = _key_pool.acquire()
+        response = send_request(
+            KEY_PARAM_PATTERN.sub(lambda match: match.group(1) + key, url, 1),
+            priority,
+        )
+        eject_seconds = get_key_eject_seconds(response)
+        if eject_seconds is None:
+            break
+        _key_pool.eject(key, eject_seconds, response.status_code)
+    return response
 
 
 # =============================================================================
-# UV INFORMATION
-# Function to get description of UV index levels
+# GET KEY EJECT SECONDS
+# Function to tell from a response whether its key should sit out, and for
+# how long. Returns None for responses that say nothing about the key.
+# =============================================================================
+def get_key_eject_seconds(response):
+    status = response.status_code
+    if status == 429:
+        retry_after = response.headers.get("Retry-After", "")
+        return int(retry_after) if retry_after.isdigit() else KEY_THROTTLED_SECONDS
+    if status == 401:
+        return KEY_REJECTED_SECONDS
+    if status == 403:
+        # A plan without forecast access is handled by the split fallback
+        try:
+            code = json.loads(response.content)["error"]["code"]
+        except (ValueError, KeyError, TypeError):
+            code = None
+        if code != ERROR_CODE_NO_ACCESS:
+            return KEY_REJECTED_SECONDS
+    return None
+
+
 # =============================================================================
-def get_uv_description(uv_index):
-    if uv_index <= 2:
-        return f"{COLORS['GREEN']}Low"  # Low risk
-    elif uv_index <= 5:
-        return f"{COLORS['YELLOW']}Moderate"  # Moderate risk
-    elif uv_index <= 7:
-        return f"{COLORS['YELLOW']}High"  # High risk
-    elif uv_index <= 10:
-        return f"{COLORS['RED']}Very High"  # Very high risk
+# FETCH JSON
+# Function to fetch a single API endpoint and decode the response
+# =============================================================================
+def fetch_json(url, priority=PRIORITY_INTERACTIVE):
+    if _key_pool is None:
+        response = send_request(url, priority)
     else:
-        return f"{COLORS['RED']}Extreme"  # Extreme risk
+        response = send_request_with_key_pool(url, priority)
+    response.raise_for_status()
+    if _recorder is not None:
+        _recorder.record(url, response.content)
+    if _timings is None:
+        # Decode the bytes directly, skipping requests' encoding detection
+        return json.loads(response.content)
+
+    endpoint = get_endpoint(url)
+    _timings.count(f"bytes.{endpoint}", len(response.content))
+    with _timings.phase(f"decode.{endpoint}"):
+        return json.loads(response.content)
 
 
 # =============================================================================
-# AIR QUALITY INFORMATION
-# Function to get description of air quality index
+# NORMALIZE LOCATION
+# Function to collapse case and whitespace so equivalent queries share a key.
+# Coordinates are rounded, so the same spot at any precision shares one key.
 # =============================================================================
-def get_air_quality_description(aqi):
-    descriptions = [
-        f"{COLORS['GREEN']}Good",  # Level 1
-        f"{COLORS['YELLOW']}Moderate",  # Level 2
-        f"{COLORS['YELLOW']}Unhealthy for Sensitive Groups",  # Level 3
-        f"{COLORS['RED']}Unhealthy",  # Level 4
-        f"{COLORS['RED']}Very Unhealthy",  # Level 5
-        f"{COLORS['RED']}Hazardous",  # Level 6
-    ]
+COORDINATES_PATTERN = re.compile(r"^(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)$")
 
-    if 1 <= aqi <= 6:
-        return descriptions[aqi - 1]
-    return "Unknown"  # For values outside 1-6 range
+
+def format_coordinates(lat, lon):
+    # Adding 0.0 turns -0.0 into 0.0 so both sides of the meridian agree
+    lat = round(float(lat), COORDINATE_PRECISION) + 0.0
+    lon = round(float(lon), COORDINATE_PRECISION) + 0.0
+    return f"{lat:.{COORDINATE_PRECISION}f},{lon:.{COORDINATE_PRECISION}f}"
+
+
+def normalize_location(location):
+    query = " ".join(location.lower().split()).replace(" ,", ",")
+    match = COORDINATES_PATTERN.match(query)
+    if match:
+        return format_coordinates(*match.groups())
+    return query
 
 
 # =============================================================================
-# WEATHER DISPLAY
-# Function to format and display the weather data to terminal
+# LOCATION INDEX
+# Functions to map each query to the canonical location the API resolved it
+# to, so "London", "london, uk" and nearby coordinates share one cache entry
+# and one upstream request. Index entries live in the response cache.
 # =============================================================================
-def display_weather(data, use_fahrenheit=True):
-    # Extract main data components
-    location = data["location"]
+def get_canonical_location(location_data):
+    try:
+        key = format_coordinates(location_data["lat"], location_data["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return {
+        "key": key,
+        "name": location_data.get("name"),
+        "region": location_data.get("region"),
+        "country": location_data.get("country"),
+        "lat": location_data["lat"],
+        "lon": location_data["lon"],
+    }
+
+
+def resolve_location(location, cache=None):
+    query = normalize_location(location)
+    if cache is None:
+        return query
+
+    canonical = cache.get(["location", query])
+    if canonical is None:
+        return query
+    return canonical["key"]
+
+
+def index_location(cache, data, *entries):
+    # Cache keys are [endpoint, query, date] - move the entries onto the
+    # canonical key and remember which query led there
+    canonical = get_canonical_location(data.get("location"))
+    if cache is None or canonical is None:
+        return entries
+
+    query = entries[0][0][1]
+    if canonical["key"] == query:
+        return entries
+
+    store_cached(
+        cache, ["location", query], canonical, time.time() + LOCATION_INDEX_TTL
+    )
+    return tuple(
+        ([key[0], canonical["key"], *key[2:]], expires_at)
+        for key, expires_at in entries
+    )
+
+
+# =============================================================================
+# RECORD OBSERVATION
+# Function to append a projected current-conditions response to the local
+# history, keyed by the canonical location so every spelling shares a series
+# =============================================================================
+def get_history():
+    global _history
+    with _history_lock:
+        if _history is None and _history_path is not None:
+            # Imported on first use so cached lookups skip sqlite3
+            from history import HistoryStore
+
+            _history = HistoryStore(_history_path)
+        return _history
+
+
+def record_observation(weather_data):
+    if _history_path is None:
+        return
+    canonical = get_canonical_location(weather_data.get("location"))
+    if canonical is None:
+        return
+    try:
+        get_history().add(canonical["key"], weather_data)
+    except Exception:
+        # History is best effort - never fail a lookup over it
+        pass
+
+
+# =============================================================================
+# STORE CACHED
+# Function to write a response to the cache without ever failing the lookup
+# =============================================================================
+def store_cached(cache, cache_key, data, expires_at):
+    if cache is None:
+        return
+    try:
+        cache.put(cache_key, data, expires_at)
+    except OSError:
+        # A read-only or full disk should never break a lookup
+        pass
+
+
+# =============================================================================
+# FETCH AND CACHE
+# Function to fetch a single endpoint and store the response in the cache
+# =============================================================================
+def fetch_and_cache(
+    url, project, cache, cache_key, expires_at, priority=PRIORITY_INTERACTIVE
+):
+    data = project(fetch_json(url, priority))
+    if "current" in data:
+        record_observation(data)
+    ((cache_key, expires_at),) = index_location(cache, data, (cache_key, expires_at))
+    store_cached(cache, cache_key, data, expires_at)
+    return data
+
+
+# =============================================================================
+# PROJECT RESPONSES
+# Functions to cut API responses down to the fields the renderer, output
+# formats and cache logic read, keeping the same nested shape. Projected
+# responses are what gets cached, so cached lookups parse less too.
+# =============================================================================
+LOCATION_FIELDS = (
+    "name",
+    "region",
+    "country",
+    "lat",
+    "lon",
+    "tz_id",
+    "localtime_epoch",
+    "localtime",
+)
+
+CURRENT_FIELDS = (
+    "last_updated_epoch",
+    "last_updated",
+    "is_day",
+    "temp_c",
+    "temp_f",
+    "wind_mph",
+    "wind_kph",
+    "wind_degree",
+    "wind_dir",
+    "pressure_mb",
+    "humidity",
+    "feelslike_c",
+    "feelslike_f",
+    "vis_miles",
+    "uv",
+)
+
+# The day's sunrise and sunset rather than is_sun_up, which only holds for the
+# moment of the request while astronomy is cached until midnight
+ASTRO_FIELDS = ("moon_phase", "sunrise", "sunset")
+
+
+def project_fields(data, fields):
+    return {field: data[field] for field in fields if field in data}
+
+
+def project_current_response(data):
     current = data["current"]
-    condition = current["condition"]
+    projected = project_fields(current, CURRENT_FIELDS)
+    projected["condition"] = project_fields(current["condition"], ("text", "code"))
+    if "us-epa-index" in current.get("air_quality", {}):
+        projected["air_quality"] = {
+            "us-epa-index": current["air_quality"]["us-epa-index"]
+        }
+    return {
+        "location": project_fields(data["location"], LOCATION_FIELDS),
+        "current": projected,
+    }
+
+
+def project_astronomy_response(data):
+    astro = data.get("astronomy", {}).get("astro", {})
+    return {
+        "location": project_fields(data["location"], LOCATION_FIELDS),
+        "astronomy": {"astro": project_fields(astro, ASTRO_FIELDS)},
+    }
+
+
+# Hourly and daily fields kept for --trend, stored column by column
+TREND_HOUR_FIELDS = ("time_epoch", "temp_c", "temp_f", "precip_mm", "chance_of_rain")
+TREND_DAY_FIELDS = ("mintemp_c", "maxtemp_c", "mintemp_f", "maxtemp_f")
+
+
+def project_trend_response(data, days):
+    forecast_days = data.get("forecast", {}).get("forecastday", [])
+    hours = [hour for day in forecast_days for hour in day.get("hour", [])]
+
+    trend = {
+        "source": "forecast",
+        "span_hours": days * 24,
+        "days": [
+            project_fields(day.get("day", {}), TREND_DAY_FIELDS)
+            for day in forecast_days
+        ],
+    }
+    for field in TREND_HOUR_FIELDS:
+        trend[field] = [hour[field] for hour in hours]
+    return trend
 
-    # Get astronomy data if available
-    astro = {}
-    moon_phase = ""
-    if "astronomy" in data and "astro" in data["astronomy"]:
-        astro = data["astronomy"]["astro"]
-        moon_phase = astro.get("moon_phase", "")
 
-    # Check if it's daytime
-    daytime = is_daytime(data)
+# =============================================================================
+# WEATHER REPORT
+# Compact record of one location's weather, built straight from the projected
+# current and astronomy responses. This is what lookups return and what the
+# renderer and output formats read.
+# =============================================================================
+class WeatherReport:
+    __slots__ = (
+        *LOCATION_FIELDS,
+        *CURRENT_FIELDS,
+        "condition",
+        "condition_code",
+        "aqi",
+        *ASTRO_FIELDS,
+        "trend",
+        "age",
+    )
 
-    # Get temperature based on user preference
-    temp = current["temp_f"] if use_fahrenheit else current["temp_c"]
-    feels_like = current["feelslike_f"] if use_fahrenheit else current["feelslike_c"]
-    temp_unit = "°F" if use_fahrenheit else "°C"
+    def __init__(self, weather_data, astronomy_data):
+        location = weather_data["location"]
+        current = weather_data["current"]
+        astro = astronomy_data.get("astronomy", {}).get("astro", {})
 
-    # Get wind speed based on user preference
-    wind_speed = current["wind_mph"] if use_fahrenheit else current["wind_kph"]
-    speed_unit = "mph" if use_fahrenheit else "kph"
+        for field in LOCATION_FIELDS:
+            setattr(self, field, location.get(field))
+        for field in CURRENT_FIELDS:
+            setattr(self, field, current.get(field))
+        for field in ASTRO_FIELDS:
+            setattr(self, field, astro.get(field))
 
-    # Get appropriate weather icon - use moon icon for clear night
-    weather_code = condition["code"]
-    weather_icon = get_weather_icon(weather_code, daytime, moon_phase)
+        self.condition = current["condition"].get("text")
+        self.condition_code = current["condition"].get("code")
+        self.aqi = current.get("air_quality", {}).get("us-epa-index")
+        self.trend = None
+        # Seconds since the data was fetched, when served past its TTL
+        self.age = None
 
-    # Override with moon icon if it's clear at night
-    if weather_code == 1000 and not daytime and moon_phase:
-        weather_icon = MOON_ICONS.get(moon_phase, "\U0001f315 ")  # Default to full moon
 
-    # Get ASCII art logo and its color
-    logo_type = get_logo_for_condition_code(weather_code, daytime)
+# =============================================================================
+# COMBINE WEATHER DATA
+# Function to merge the current weather and astronomy responses, plus the
+# optional hourly trend, into a report
+# =============================================================================
+def combine_weather_data(weather_data, astronomy_data, trend_data=None):
+    report = WeatherReport(weather_data, astronomy_data)
+    if trend_data is not None:
+        report.trend = build_trend_columns(trend_data)
+    return report
 
-    # Select logo based on weather condition and time of day
-    if logo_type == "clear_night" and moon_phase in MOON_PHASE_ASCII:
-        # Use specific moon phase ASCII art for clear nights
-        logo = MOON_PHASE_ASCII[moon_phase]
-        logo_color = COLORS.get("BLUE", Fore.BLUE)  # Use blue for night sky
-    elif logo_type == "clear_night":
-        # Fallback to generic night sky if moon phase not found
-        logo = NIGHT_LOGO["clear_night"]
-        logo_color = COLORS.get("BLUE", Fore.BLUE)
-    else:
-        # Use regular weather ASCII art for other conditions
-        logo = WEATHER_LOGO[logo_type]
-        logo_color = WEATHER_COLORS.get(logo_type, Fore.WHITE)
 
-    # Apply color to the logo
-    colored_logo = [f"{logo_color}{line}{COLORS['RESET']}" for line in logo]
+# =============================================================================
+# BUILD TREND COLUMNS
+# Function to pack the hourly series of a projected trend into float arrays,
+# so aggregation runs over contiguous columns instead of per-hour values
+# =============================================================================
+def build_trend_columns(trend_data):
+    from utils.series_utils import to_column
+
+    trend = dict(trend_data)
+    for field in TREND_HOUR_FIELDS:
+        if field in trend:
+            trend[field] = to_column(trend[field])
+    return trend
+
 
-    # Format location and time information
-    location_str = f"{location['name']}, {location['region']}, {location['country']}"
-    local_time = format_time(current["last_updated"])
+# =============================================================================
+# NORMALIZE FORECAST DATA
+# Function to split a forecast.json response into the same projected
+# (current, astronomy) shapes used for current.json and astronomy.json
+# =============================================================================
+def normalize_forecast_data(forecast_data):
+    forecast_days = forecast_data.get("forecast", {}).get("forecastday", [])
+    if not forecast_days or "astro" not in forecast_days[0]:
+        raise ValueError("forecast response has no astronomy data")
 
-    # Format wind direction arrow
-    wind_arrow = get_wind_direction_arrow(current["wind_degree"])
+    weather_data = project_current_response(forecast_data)
+    astronomy_data = {
+        "location": weather_data["location"],
+        "astronomy": {"astro": project_fields(forecast_days[0]["astro"], ASTRO_FIELDS)},
+    }
+    return weather_data, astronomy_data
 
-    # Format UV index description
-    uv_desc = get_uv_description(current["uv"])
 
-    # Air quality if available
-    aqi_info = ""
-    if "air_quality" in current and "us-epa-index" in current["air_quality"]:
-        aqi = current["air_quality"]["us-epa-index"]
-        aqi_desc = get_air_quality_description(aqi)
-        aqi_info = (
-            f"  {COLORS['BOLD']}Air Quality:{COLORS['RESET']} {aqi_desc} ({aqi}/6)"
+# =============================================================================
+# FETCH WEATHER (FORECAST)
+# Function to fetch current conditions and astronomy with one forecast.json
+# call, falling back to the two-call path if the key has no forecast access
+# or the response is missing astronomy data
+# =============================================================================
+def fetch_weather_forecast(
+    api_key,
+    location,
+    today,
+    cache,
+    current_entry,
+    astronomy_entry,
+    priority=PRIORITY_INTERACTIVE,
+    trend_entry=None,
+    trend_days=0,
+):
+    trend_data = None
+    try:
+        # With --trend, one extra day covers the hours past midnight
+        days = min(trend_days + 1, MAX_FORECAST_DAYS) if trend_days else 1
+        forecast_data = fetch_json(
+            build_forecast_url(api_key, location, days), priority
+        )
+        weather_data, astronomy_data = normalize_forecast_data(forecast_data)
+        if trend_days:
+            trend_data = project_trend_response(forecast_data, trend_days)
+    except Exception as e:
+        # 403 means the key's plan does not include forecast.json
+        response = getattr(e, "response", None)
+        forbidden = getattr(response, "status_code", None) == 403
+        if not forbidden and not isinstance(e, (KeyError, ValueError)):
+            raise
+
+        # Fall back to the separate current and astronomy endpoints
+        weather_url, astronomy_url = build_request_urls(api_key, location, today)
+        weather_data = project_current_response(fetch_json(weather_url, priority))
+        astronomy_data = project_astronomy_response(fetch_json(astronomy_url, priority))
+        if trend_days:
+            trend_data = get_history_trend(trend_entry[0][1], trend_days)
+
+    record_observation(weather_data)
+
+    # Cache both halves so either strategy can reuse them
+    current_entry, astronomy_entry = index_location(
+        cache, weather_data, current_entry, astronomy_entry
+    )
+    current_key, current_expires_at = current_entry
+    astronomy_key, astronomy_expires_at = astronomy_entry
+    store_cached(cache, current_key, weather_data, current_expires_at)
+    store_cached(cache, astronomy_key, astronomy_data, astronomy_expires_at)
+    if trend_data is not None and trend_data["source"] == "forecast":
+        ((trend_key, trend_expires_at),) = index_location(
+            cache, weather_data, trend_entry
         )
+        store_cached(cache, trend_key, trend_data, trend_expires_at)
 
-    moon_info = ""
-    if moon_phase and not daytime:
-        moon_info = f"\n{COLORS['BOLD']}Moon Phase:{COLORS['RESET']} {moon_phase}"
+    return combine_weather_data(weather_data, astronomy_data, trend_data)
 
-    # Build the output display
-    # Left side - Logo (colored ASCII art)
-    left_content = colored_logo
 
-    # Determine padding based on logo type
-    pad_width = (
-        15 if logo_type == "clear_night" and moon_phase in MOON_PHASE_ASCII else 15
-    )
-    # Pad to match the longest line (accounting for ANSI color codes)
-    left_content = [
-        line.ljust(pad_width + len(logo_color) + len(COLORS["RESET"]))
-        for line in left_content
-    ]
+# =============================================================================
+# FETCH TREND
+# Function to fetch the hourly forecast for --trend on its own, falling back
+# to the locally stored history when the forecast is not available. Never
+# raises - a lookup without a trend is still a good lookup.
+# =============================================================================
+def fetch_trend(
+    api_key, location, days, cache, trend_entry, priority=PRIORITY_INTERACTIVE
+):
+    try:
+        forecast_data = fetch_json(
+            build_forecast_url(api_key, location, min(days + 1, MAX_FORECAST_DAYS)),
+            priority,
+        )
+        trend_data = project_trend_response(forecast_data, days)
+    except Exception:
+        return get_history_trend(trend_entry[0][1], days)
 
-    # Right side - Weather information
-    right_template = [
-        f"{COLORS['BOLD']}{COLORS['CYAN']}{location_str}{COLORS['RESET']}",  # Location
-        f"{COLORS['BOLD']}Weather:{COLORS['RESET']} {weather_icon} {condition['text']}",  # Condition
-        f"{COLORS['BOLD']}Temperature:{COLORS['RESET']} {temp}{temp_unit} (Feels like: {feels_like}{temp_unit})",  # Temp
-        f"{COLORS['BOLD']}Humidity:{COLORS['RESET']} {current['humidity']}%",  # Humidity
-        f"{COLORS['BOLD']}Wind:{COLORS['RESET']} {wind_speed} {speed_unit} {wind_arrow} {current['wind_dir']}",  # Wind
-        f"{COLORS['BOLD']}Pressure:{COLORS['RESET']} {current['pressure_mb']} mb",  # Pressure
-        f"{COLORS['BOLD']}Visibility:{COLORS['RESET']} {current['vis_miles']} miles",  # Visibility
-        f"{COLORS['BOLD']}UV Index:{COLORS['RESET']} {current['uv']} ({uv_desc}{COLORS['RESET']})"
-        + aqi_info,  # UV Index & AQI
-    ]
+    ((trend_key, trend_expires_at),) = index_location(cache, forecast_data, trend_entry)
+    store_cached(cache, trend_key, trend_data, trend_expires_at)
+    return trend_data
 
-    # Add moon phase info if available and it's night
-    if moon_phase and not daytime:
-        right_template.append(
-            f"{COLORS['BOLD']}Moon Phase:{COLORS['RESET']} {moon_phase}"
+
+# =============================================================================
+# GET HISTORY TREND
+# Function to build a trend from the observations stored for the past days,
+# or None if there is no history for the location
+# =============================================================================
+def get_history_trend(query, days):
+    if _history_path is None or not os.path.exists(_history_path):
+        return None
+
+    now = time.time()
+    try:
+        series = get_history().series(
+            query, now - days * 24 * 60 * 60, now + 1, ("temp_c", "temp_f")
         )
+    except Exception:
+        return None
+    if len(series["last_updated_epoch"]) < 2:
+        return None
 
-    # Add last updated time at the end
-    right_template.append(f"{COLORS['BOLD']}Updated:{COLORS['RESET']} {local_time}")
+    return {
+        "source": "history",
+        "span_hours": days * 24,
+        "days": [],
+        "time_epoch": series["last_updated_epoch"],
+        "temp_c": series["temp_c"],
+        "temp_f": series["temp_f"],
+    }
 
-    # Combine left and right content
-    lines = []
-    for i in range(max(len(left_content), len(right_template))):
-        # Get left side content or empty space if we've run out of logo lines
-        left = left_content[i] if i < len(left_content) else " " * pad_width
-        # Get right side content or empty string if we've run out of template lines
-        right = right_template[i] if i < len(right_template) else ""
-        # Combine the two sides
-        lines.append(f"{left} {right}")
 
-    # Determine the length of the separator line based on the logo type
-    separator_length = (
-        72 if logo_type == "clear_night" and moon_phase in MOON_PHASE_ASCII else 64
-    )
-    # Add a separator line at the top and bottom
-    separator = f"{COLORS['BLUE']}{'─' * separator_length}{COLORS['RESET']}"
+# =============================================================================
+# FUTURE HELPERS
+# Functions to wrap known values and merge the two split requests into a
+# single future, so callers always wait on one future per location
+# =============================================================================
+def completed_future(value):
+    from concurrent.futures import Future
+
+    future = Future()
+    future.set_result(value)
+    return future
+
 
-    # Display the full output
-    print(separator)  # Top separator
-    for line in lines:  # Content lines
-        print(line)
-    print(separator)  # Bottom separator
+def combine_futures(weather_future, astronomy_future, trend_future=None):
+    from concurrent.futures import Future
+
+    combined = Future()
+    lock = threading.Lock()
+    if trend_future is None:
+        trend_future = completed_future(None)
+    futures = (weather_future, astronomy_future, trend_future)
+
+    def on_done(_):
+        with lock:
+            if combined.done():
+                return
+            if not all(future.done() for future in futures):
+                return
+            try:
+                combined.set_result(
+                    combine_weather_data(*(future.result() for future in futures))
+                )
+            except Exception as e:
+                combined.set_exception(e)
+
+    for future in futures:
+        future.add_done_callback(on_done)
+    return combined
 
 
 # =============================================================================
-# MAIN - Entry point of the program
+# GET CACHE ENTRIES
+# Function to build the (key, expires_at) cache entries for both endpoints,
+# keyed by the canonical location when the query has been seen before
 # =============================================================================
-def main():
-    # Set up command line argument parsing
-    parser = argparse.ArgumentParser(
-        description="Weather CLI - Display weather information in a terminal"
+def get_cache_entries(location, now, current_ttl=DEFAULT_CURRENT_TTL, cache=None):
+    today = now.strftime("%Y-%m-%d")
+    query = resolve_location(location, cache)
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    current_entry = (["current", query, today], now.timestamp() + current_ttl)
+    astronomy_entry = (["astronomy", query, today], midnight.timestamp())
+    return current_entry, astronomy_entry
+
+
+# =============================================================================
+# GET CACHED WEATHER
+# Function to answer a lookup straight from the cache, without starting any
+# threads or importing the HTTP stack. Returns None on a miss.
+# =============================================================================
+def get_cached_weather(location, cache, trend_days=0):
+    if cache is None:
+        return None
+
+    now = datetime.now()
+    current_entry, astronomy_entry = get_cache_entries(location, now, cache=cache)
+    weather_data = cache.get(current_entry[0])
+    if weather_data is None:
+        return None
+    astronomy_data = cache.get(astronomy_entry[0])
+    if astronomy_data is None:
+        return None
+
+    trend_data = None
+    if trend_days:
+        trend_data = cache.get(get_trend_entry(current_entry, now, trend_days)[0])
+        if trend_data is None:
+            return None
+    return combine_weather_data(weather_data, astronomy_data, trend_data)
+
+
+# =============================================================================
+# GET TREND ENTRY
+# Function to build the (key, expires_at) cache entry for the hourly trend,
+# next to the current conditions entry for the same location
+# =============================================================================
+def get_trend_entry(current_entry, now, days):
+    _, query, today = current_entry[0]
+    return ["trend", query, today, days], now.timestamp() + DEFAULT_TREND_TTL
+
+
+# =============================================================================
+# SUBMIT WEATHER REQUESTS
+# Function to start fetching the combined weather data for a location.
+# Returns a future for the combined data. Cached responses are keyed by
+# (endpoint, normalized location, date): astronomy data is valid for the rest
+# of the calendar day, current conditions for current_ttl seconds. Only the
+# parts missing from the cache are requested. Once the monthly budget is
+# nearly used up, expired cached responses are served instead where possible.
+# With trend_days, the hourly trend for that many days is included as well.
+# =============================================================================
+def submit_weather_requests(
+    executor,
+    api_key,
+    location,
+    cache=None,
+    current_ttl=DEFAULT_CURRENT_TTL,
+    strategy=DEFAULT_FETCH_STRATEGY,
+    priority=PRIORITY_INTERACTIVE,
+    trend_days=0,
+):
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    current_entry, astronomy_entry = get_cache_entries(
+        location, now, current_ttl, cache
     )
-    parser.add_argument("location", help="Location (city name, ZIP code, coordinates)")
-    parser.add_argument(
-        "--celsius",
-        "-c",
-        action="store_true",
-        help="Display temperature in Celsius",
+    trend_entry = (
+        get_trend_entry(current_entry, now, trend_days) if trend_days else None
     )
 
-    # Parse the command line arguments
-    args = parser.parse_args()
+    # Check the cache first
+    weather_data = astronomy_data = trend_data = None
+    if cache is not None:
+        weather_data = cache.get(current_entry[0])
+        astronomy_data = cache.get(astronomy_entry[0])
+        if trend_entry is not None:
+            trend_data = cache.get(trend_entry[0])
+    trend_missing = trend_entry is not None and trend_data is None
+    if weather_data is not None and astronomy_data is not None and not trend_missing:
+        return completed_future(
+            combine_weather_data(weather_data, astronomy_data, trend_data)
+        )
 
-    # Get API key from the .env file
-    api_key = get_api_key("WEATHER_API_KEY", "./.env")
+    # Close to the monthly budget - stale data beats spending what is left
+    if cache is not None and _quota is not None and _quota.is_low():
+        if weather_data is None:
+            weather_data = cache.get(current_entry[0], allow_stale=True)
+        if astronomy_data is None:
+            astronomy_data = cache.get(astronomy_entry[0], allow_stale=True)
+        if trend_missing:
+            trend_data = cache.get(trend_entry[0], allow_stale=True)
+        if weather_data is not None and astronomy_data is not None:
+            return completed_future(
+                combine_weather_data(weather_data, astronomy_data, trend_data)
+            )
+
+    def submit_fetch(fetch_priority=priority):
+        return submit_fetch_requests(
+            executor,
+            api_key,
+            location,
+            today,
+            cache,
+            current_entry,
+            astronomy_entry,
+            strategy,
+            fetch_priority,
+            trend_entry,
+            trend_days,
+            weather_data,
+            astronomy_data,
+            trend_data,
+        )
 
-    # Check if API key was found
-    if not api_key:
-        print(
-            f"{COLORS['RED']}Error: API key is required. Provide it with --api-key or set WEATHER_API_KEY environment variable."
+    # Recently expired - show it now and refresh it in the background
+    stale_report, expires_at = get_stale_report(
+        cache, current_entry, astronomy_entry, trend_entry, now
+    )
+    if stale_report is None:
+        return submit_fetch()
+    if now.timestamp() < expires_at + STALE_SETTINGS["revalidate_window"]:
+        # Nobody waits on the refresh, so it queues behind live lookups and
+        # leaves the quota reserve to them
+        revalidate(current_entry[0], lambda: submit_fetch(PRIORITY_BATCH))
+        return completed_future(stale_report)
+
+    # Older - try the API, but keep the stale data if it fails or is slow
+    return with_stale_fallback(submit_fetch(), stale_report, STALE_SETTINGS["timeout"])
+
+
+# =============================================================================
+# SUBMIT FETCH REQUESTS
+# Function to submit the API requests for whatever is missing from the
+# cache - weather_data, astronomy_data and trend_data are the fresh parts
+# already cached, or None - and return a future for the combined report
+# =============================================================================
+def submit_fetch_requests(
+    executor,
+    api_key,
+    location,
+    today,
+    cache,
+    current_entry,
+    astronomy_entry,
+    strategy,
+    priority,
+    trend_entry,
+    trend_days,
+    weather_data,
+    astronomy_data,
+    trend_data,
+):
+    trend_missing = trend_entry is not None and trend_data is None
+
+    # One forecast.json call covers both endpoints, and the trend
+    if strategy == "forecast" and weather_data is None:
+        return executor.submit(
+            fetch_weather_forecast,
+            api_key,
+            location,
+            today,
+            cache,
+            current_entry,
+            astronomy_entry,
+            priority,
+            trend_entry,
+            trend_days,
         )
-        sys.exit(1)  # Exit with error code
 
-    # Get weather data for requested location
-    data = get_weather(api_key, args.location)
+    # Otherwise fetch whichever of the two endpoints is missing
+    weather_url, astronomy_url = build_request_urls(api_key, location, today)
+    if weather_data is None:
+        weather_future = executor.submit(
+            fetch_and_cache,
+            weather_url,
+            project_current_response,
+            cache,
+            *current_entry,
+            priority,
+        )
+    else:
+        weather_future = completed_future(weather_data)
+    if astronomy_data is None:
+        astronomy_future = executor.submit(
+            fetch_and_cache,
+            astronomy_url,
+            project_astronomy_response,
+            cache,
+            *astronomy_entry,
+            priority,
+        )
+    else:
+        astronomy_future = completed_future(astronomy_data)
+    if trend_missing:
+        trend_future = executor.submit(
+            fetch_trend, api_key, location, trend_days, cache, trend_entry, priority
+        )
+    else:
+        trend_future = completed_future(trend_data)
+    return combine_futures(weather_future, astronomy_future, trend_future)
+
+
+# =============================================================================
+# GET STALE ENTRY
+# Function to read a cache entry whether expired or not, falling back to
+# the previous day's entry just after midnight. Returns None if there is
+# none, or if it is past the maximum staleness.
+# =============================================================================
+def get_stale_entry(cache, cache_key, now):
+    if STALE_SETTINGS["max_staleness"] <= 0:
+        return None
+
+    endpoint, query, day, *rest = cache_key
+    yesterday = (now - timedelta(days=1)).strftime("%Y-%m-%d")
+    for key in (cache_key, [endpoint, query, yesterday, *rest]):
+        entry = cache.get_entry(key)
+        if entry is None:
+            continue
+        if (
+            entry.get("expires_at", 0) + STALE_SETTINGS["max_staleness"]
+            > now.timestamp()
+        ):
+            return entry
+    return None
+
+
+# =============================================================================
+# GET STALE REPORT
+# Function to build a report from cached data past its TTL, marked with its
+# age. Returns (report, expiry time of the current conditions), or
+# (None, None) when there is nothing recent enough to show.
+# =============================================================================
+def get_stale_report(cache, current_entry, astronomy_entry, trend_entry, now):
+    if cache is None:
+        return None, None
+
+    weather = get_stale_entry(cache, current_entry[0], now)
+    if weather is None:
+        return None, None
+    astronomy = get_stale_entry(cache, astronomy_entry[0], now)
+    if astronomy is None:
+        return None, None
+    trend = get_stale_entry(cache, trend_entry[0], now) if trend_entry else None
+
+    report = combine_weather_data(
+        weather["data"], astronomy["data"], trend and trend["data"]
+    )
+    expires_at = weather.get("expires_at", 0)
+    if expires_at <= now.timestamp():
+        report.age = now.timestamp() - weather.get("stored_at", expires_at)
+    return report, expires_at
+
+
+# =============================================================================
+# REVALIDATE
+# Function to start a background refresh of a location, unless one is
+# already running for it. submit_fetch must return a future.
+# =============================================================================
+def revalidate(cache_key, submit_fetch):
+    key = json.dumps(cache_key)
+    with _revalidating_lock:
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+
+    def on_done(future):
+        with _revalidating_lock:
+            _revalidating.discard(key)
+        # Refresh failures are only reported through --timings
+        if future.exception() is not None and _timings is not None:
+            _timings.count("revalidate.failed")
+
+    try:
+        track_background(submit_fetch()).add_done_callback(on_done)
+    except Exception:
+        with _revalidating_lock:
+            _revalidating.discard(key)
+
 
-    # Display weather information
-    # Note: --celsius flag inverts the use_fahrenheit parameter
-    display_weather(data, use_fahrenheit=not args.celsius)
+# =============================================================================
+# BACKGROUND FETCHES
+# Functions to keep track of fetches still running after their answer was
+# given, so main() can wait for them before closing history, the quota and
+# timings, and before stopping a replay server
+# =============================================================================
+def track_background(future):
+    with _revalidating_lock:
+        _background.add(future)
+
+    def forget(done):
+        with _revalidating_lock:
+            _background.discard(done)
+
+    future.add_done_callback(forget)
+    return future
+
+
+def wait_for_background(timeout):
+    with _revalidating_lock:
+        pending = list(_background)
+    if not pending:
+        return
+    from concurrent.futures import wait
+
+    wait(pending, timeout=timeout)
+
+
+# =============================================================================
+# WITH STALE FALLBACK
+# Function to wrap a fetch so that stale_report is used instead when the
+# fetch fails or takes longer than timeout seconds. A slow fetch still
+# completes in the background and updates the cache.
+# =============================================================================
+def with_stale_fallback(future, stale_report, timeout=None):
+    from concurrent.futures import Future
+
+    result = Future()
+    lock = threading.Lock()
+
+    def settle(value):
+        with lock:
+            if not result.done():
+                result.set_result(value)
+
+    def on_done(done):
+        if timer is not None:
+            timer.cancel()
+        settle(stale_report if done.exception() is not None else done.result())
+
+    timer = None
+    if timeout:
+        track_background(future)
+        timer = threading.Timer(timeout, settle, (stale_report,))
+        timer.daemon = True
+        timer.start()
+    future.add_done_callback(on_done)
+    return result
+
+
+# =============================================================================
+# GET WEATHER DATA
+# Function to fetch data from the weather API
+# =============================================================================
+def get_weather(
+    api_key,
+    location,
+    cache=None,
+    current_ttl=DEFAULT_CURRENT_TTL,
+    strategy=DEFAULT_FETCH_STRATEGY,
+    trend_days=0,
+):
+    # Fast path - cached lookups never touch the network
+    data = get_cached_weather(location, cache, trend_days)
+    if data is not None:
+        return data
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    # Not waited for on return, so a background refresh of stale data does
+    # not hold up the answer (main() waits for it before exiting)
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        # Fetch current weather and astronomy data at the same time
+        future = submit_weather_requests(
+            executor,
+            api_key,
+            location,
+            cache,
+            current_ttl,
+            strategy,
+            trend_days=trend_days,
+        )
+        return future.result()
+    except Exception as e:
+        print(
+            f"{COLORS['RED']}Error fetching weather data: "
+            f"{describe_error(e)}{COLORS['RESET']}",
+            file=sys.stderr,
+        )
+        sys.exit(1)
+    finally:
+        executor.shutdown(wait=False)
+
+
+# =============================================================================
+# GET WEATHER DATA (BATCH)
+# Function to fetch many locations concurrently over a bounded thread pool.
+# Yields (location, data, error) tuples in input order, or as soon as each
+# location completes with ordered=False, so one failing location does not
+# abort the rest of the run. Locations that resolve to the same place share
+# a single request. Batch requests queue behind interactive lookups.
+# =============================================================================
+def get_weather_batch(
+    api_key,
+    locations,
+    max_workers=DEFAULT_WORKERS,
+    cache=None,
+    current_ttl=DEFAULT_CURRENT_TTL,
+    strategy=DEFAULT_FETCH_STRATEGY,
+    ordered=True,
+    priority=PRIORITY_BATCH,
+    trend_days=0,
+):
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    # Background refreshes of stale data may outlive the batch (see get_weather)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # Submit the requests for every distinct place up front
+        futures = {}
+        pending = []
+        for location in locations:
+            query = resolve_location(location, cache)
+            if query not in futures:
+                futures[query] = submit_weather_requests(
+                    executor,
+                    api_key,
+                    location,
+                    cache,
+                    current_ttl,
+                    strategy,
+                    priority,
+                    trend_days,
+                )
+            pending.append((location, futures[query]))
+
+        # Collect results in input order, or in completion order
+        if not ordered:
+            locations_by_future = {}
+            for location, future in pending:
+                locations_by_future.setdefault(future, []).append(location)
+            pending = (
+                (location, future)
+                for future in as_completed(locations_by_future)
+                for location in locations_by_future[future]
+            )
+
+        for location, future in pending:
+            try:
+                data = future.result()
+            except Exception as e:
+                yield location, None, e
+            else:
+                yield location, data, None
+    finally:
+        executor.shutdown(wait=False)
+
+
+# =============================================================================
+# READ LOCATIONS FILE
+# Function to read one location per line from a file ("-" for stdin)
+# =============================================================================
+def read_locations_file(path):
+    if path == "-":
+        lines = sys.stdin.readlines()
+    else:
+        with open(path, "r") as f:
+            lines = f.readlines()
+
+    locations = []
+    for line in lines:
+        line = line.strip()
+        # Skip empty lines and comments
+        if not line or line.startswith("#"):
+            continue
+        locations.append(line)
+    return locations
+
+
+# =============================================================================
+# FORMAT TIME
+# Function to convert API timestamp to a more readable format. Cached, since
+# many locations share the same update time and strptime is slow.
+# =============================================================================
+@functools.lru_cache(maxsize=1024)
+def format_time(timestamp, format_str="%Y-%m-%d %H:%M"):
+    try:
+        # Parse the timestamp string into a datetime object
+        dt = datetime.strptime(timestamp, format_str)
+        # Format datetime into a more readable string
+        return dt.strftime("%A, %B %d, %Y at %I:%M %p")
+    except Exception:
+        # Return the original timestamp if parsing fails
+        return timestamp
+
+
+# =============================================================================
+# GET WIND DIRECTION ARROWS
+# Function to convert degrees to directional arrow
+# =============================================================================
+# Wind direction arrows (8 directions)
+WIND_ARROWS = ("↑", "↗", "→", "↘", "↓", "↙", "←", "↖")
+
+
+def get_wind_direction_arrow(degrees):
+    # Convert degrees to one of 8 directions (divide by 45 degrees)
+    index = round(degrees / 45) % 8
+    return WIND_ARROWS[index]
+
+
+# =============================================================================
+# LOCAL TIME
+# Function to get the time at a location from the tz_id the API returns, or
+# None if the time zone is unknown
+# =============================================================================
+def get_local_time(tz_id, now=None):
+    if not tz_id:
+        return None
+    if now is None:
+        now = datetime.now()
+    try:
+        from zoneinfo import ZoneInfo
+
+        return now.astimezone(ZoneInfo(tz_id))
+    except (ImportError, ValueError, KeyError, OSError):
+        return None
+
+
+def get_utc_offset(localtime, localtime_epoch):
+    # Seconds the location is ahead of UTC, from the local time and epoch the
+    # API sends with each response - cheaper than loading its time zone
+    try:
+        date_text, clock = localtime.split()
+        year, month, day = map(int, date_text.split("-"))
+        hours, minutes = map(int, clock.split(":"))
+        local = datetime(year, month, day, hours, minutes, tzinfo=timezone.utc)
+        offset = local.timestamp() - localtime_epoch
+    except (AttributeError, TypeError, ValueError):
+        return None
+    # localtime is in whole minutes, every real offset a multiple of 15
+    return round(offset / 900) * 900
+
+
+def parse_clock_time(text):
+    # Minutes past midnight of an "07:29 AM" style time, or None for values
+    # like "No sunrise" in polar regions
+    try:
+        clock, meridiem = text.split()
+        hours, minutes = map(int, clock.split(":"))
+    except (AttributeError, ValueError):
+        return None
+    if meridiem not in ("AM", "PM"):
+        return None
+    return (hours % 12 + (12 if meridiem == "PM" else 0)) * 60 + minutes
+
+
+# =============================================================================
+# DAYTIME CHECK
+# Function to check if it's daytime at the location right now
+# =============================================================================
+def is_daytime(data):
+    # Today's sunrise and sunset against the local time there, so cached
+    # astronomy data stays right all day
+    sunrise = parse_clock_time(data.sunrise)
+    sunset = parse_clock_time(data.sunset)
+    if sunrise is not None and sunset is not None:
+        offset = get_utc_offset(data.localtime, data.localtime_epoch)
+        if offset is not None:
+            minute = int(time.time() + offset) // 60 % (24 * 60)
+            return sunrise <= minute < sunset
+        local_time = get_local_time(data.tz_id)
+        if local_time is not None:
+            return sunrise <= local_time.hour * 60 + local_time.minute < sunset
+
+    # Otherwise the flag sent with the (shorter lived) current conditions
+    if data.is_day is not None:
+        return data.is_day == 1
+
+    # Fallback to checking the current hour against general sunrise/sunset times
+    current_hour = datetime.now().hour
+    return 6 <= current_hour < 18  # Assume daytime is 6 AM to 6 PM if no data
+
+
+# =============================================================================
+# UV INFORMATION
+# Function to get description of UV index levels
+# =============================================================================
+# Upper bound of each UV risk level with its color and label
+UV_LEVELS = (
+    (2, "GREEN", "Low"),  # Low risk
+    (5, "YELLOW", "Moderate"),  # Moderate risk
+    (7, "YELLOW", "High"),  # High risk
+    (10, "RED", "Very High"),  # Very high risk
+    (float("inf"), "RED", "Extreme"),  # Extreme risk
+)
+
+# Prebuilt descriptions for each color mode
+UV_DESCRIPTIONS = {
+    use_color: tuple(
+        (limit, f"{palette[color]}{label}") for limit, color, label in UV_LEVELS
+    )
+    for use_color, palette in PALETTES.items()
+}
+
+
+def get_uv_description(uv_index, use_color=None):
+    if use_color is None:
+        use_color = USE_COLOR
+    for limit, description in UV_DESCRIPTIONS[use_color]:
+        if uv_index <= limit:
+            return description
+
+
+# =============================================================================
+# AIR QUALITY INFORMATION
+# Function to get description of air quality index
+# =============================================================================
+AIR_QUALITY_LEVELS = (
+    ("GREEN", "Good"),  # Level 1
+    ("YELLOW", "Moderate"),  # Level 2
+    ("YELLOW", "Unhealthy for Sensitive Groups"),  # Level 3
+    ("RED", "Unhealthy"),  # Level 4
+    ("RED", "Very Unhealthy"),  # Level 5
+    ("RED", "Hazardous"),  # Level 6
+)
+
+# Prebuilt descriptions for each color mode
+AIR_QUALITY_DESCRIPTIONS = {
+    use_color: tuple(f"{palette[color]}{label}" for color, label in AIR_QUALITY_LEVELS)
+    for use_color, palette in PALETTES.items()
+}
+
+
+def get_air_quality_description(aqi, use_color=None):
+    if use_color is None:
+        use_color = USE_COLOR
+    if 1 <= aqi <= 6:
+        return AIR_QUALITY_DESCRIPTIONS[use_color][aqi - 1]
+    return "Unknown"  # For values outside 1-6 range
+
+
+# =============================================================================
+# RENDER TEMPLATES
+# Label fragments for the right side of the panel, prebuilt per color mode
+# =============================================================================
+def build_render_labels(palette):
+    bold, reset = palette["BOLD"], palette["RESET"]
+    return {
+        "location": f"{bold}{palette['CYAN']}",
+        "weather": f"{bold}Weather:{reset} ",
+        "temperature": f"{bold}Temperature:{reset} ",
+        "humidity": f"{bold}Humidity:{reset} ",
+        "wind": f"{bold}Wind:{reset} ",
+        "pressure": f"{bold}Pressure:{reset} ",
+        "visibility": f"{bold}Visibility:{reset} ",
+        "uv": f"{bold}UV Index:{reset} ",
+        "air_quality": f"  {bold}Air Quality:{reset} ",
+        "moon_phase": f"{bold}Moon Phase:{reset} ",
+        "updated": f"{bold}Updated:{reset} ",
+        "stale": palette["YELLOW"],
+        "trend_temperature": f"{bold}Temp {{}}:{reset} ",
+        "trend_rain": f"{bold}Rain {{}}:{reset} ",
+        "reset": reset,
+    }
+
+
+RENDER_LABELS = {
+    use_color: build_render_labels(palette) for use_color, palette in PALETTES.items()
+}
+
+
+# =============================================================================
+# GET LOGO BLOCK
+# Function to build the left side of the panel once per combination of
+# condition code, day/night, moon phase and color mode. Returns the padded,
+# colored logo lines (each ending in the column gap), the filler used below
+# the logo, the separator line and the weather icon.
+# =============================================================================
+@functools.lru_cache(maxsize=1024)
+def get_logo_block(weather_code, daytime, moon_phase, use_color):
+    palette = PALETTES[use_color]
+
+    # Get appropriate weather icon - moon icon at night
+    weather_icon = get_weather_icon(weather_code, daytime, moon_phase)
+
+    # Get ASCII art logo and its color
+    logo_type = get_logo_for_condition_code(weather_code, daytime)
+    moon_art = logo_type == "clear_night" and moon_phase in MOON_PHASE_ASCII
+
+    # Select logo based on weather condition and time of day
+    if moon_art:
+        # Use specific moon phase ASCII art for clear nights
+        logo = MOON_PHASE_ASCII[moon_phase]
+        logo_color = palette["BLUE"]  # Use blue for night sky
+    elif logo_type == "clear_night":
+        # Fallback to generic night sky if moon phase not found
+        logo = NIGHT_LOGO["clear_night"]
+        logo_color = palette["BLUE"]
+    else:
+        # Use regular weather ASCII art for other conditions
+        logo = WEATHER_LOGO[logo_type]
+        logo_color = palette[WEATHER_COLOR_NAMES.get(logo_type, "WHITE")]
+
+    # Apply color and pad to match the longest line (accounting for ANSI codes)
+    pad_width = 15
+    width = pad_width + len(logo_color) + len(palette["RESET"])
+    left_content = tuple(
+        f"{logo_color}{line}{palette['RESET']}".ljust(width) + " " for line in logo
+    )
+    filler = " " * pad_width + " "
+
+    # Separator line for the top and bottom, wider for the moon phase art
+    separator_length = 72 if moon_art else 64
+    separator = f"{palette['BLUE']}{'─' * separator_length}{palette['RESET']}"
+
+    return left_content, filler, separator, weather_icon
+
+
+# =============================================================================
+# WEATHER RENDERING
+# Function to format the weather data into the lines of a display panel.
+# Everything that only depends on the condition, time of day, moon phase and
+# color mode comes prebuilt from get_logo_block and RENDER_LABELS.
+# =============================================================================
+def render_weather(data, use_fahrenheit=True, use_color=None):
+    if use_color is None:
+        use_color = USE_COLOR
+    labels = RENDER_LABELS[use_color]
+    reset = labels["reset"]
+
+    # Get moon phase from astronomy data if available
+    moon_phase = data.moon_phase or ""
+
+    # Check if it's daytime
+    daytime = is_daytime(data)
+
+    # Get temperature and wind speed based on user preference
+    if use_fahrenheit:
+        temp, feels_like, temp_unit = data.temp_f, data.feelslike_f, "°F"
+        wind_speed, speed_unit = data.wind_mph, "mph"
+    else:
+        temp, feels_like, temp_unit = data.temp_c, data.feelslike_c, "°C"
+        wind_speed, speed_unit = data.wind_kph, "kph"
+
+    # Prebuilt logo, separator and icon for this condition
+    left_content, filler, separator, weather_icon = get_logo_block(
+        data.condition_code, daytime, moon_phase, use_color
+    )
+
+    # UV index, plus air quality if available
+    uv_info = (
+        f"{labels['uv']}{data.uv} ({get_uv_description(data.uv, use_color)}{reset})"
+    )
+    if data.aqi is not None:
+        aqi_desc = get_air_quality_description(data.aqi, use_color)
+        uv_info += f"{labels['air_quality']}{aqi_desc} ({data.aqi}/6){reset}"
+
+    # Right side - Weather information
+    right_template = [
+        f"{labels['location']}{data.name}, {data.region}, {data.country}{reset}",
+        f"{labels['weather']}{weather_icon} {data.condition}",
+        f"{labels['temperature']}{temp}{temp_unit} (Feels like: {feels_like}{temp_unit})",
+        f"{labels['humidity']}{data.humidity}%",
+        f"{labels['wind']}{wind_speed} {speed_unit} "
+        f"{get_wind_direction_arrow(data.wind_degree)} {data.wind_dir}",
+        f"{labels['pressure']}{data.pressure_mb} mb",
+        f"{labels['visibility']}{data.vis_miles} miles",
+        uv_info,
+    ]
+
+    # Hourly trend sparklines with --trend
+    if data.trend is not None:
+        right_template.extend(render_trend(data.trend, use_fahrenheit, use_color))
+
+    # Add moon phase info if available and it's night
+    if moon_phase and not daytime:
+        right_template.append(f"{labels['moon_phase']}{moon_phase}")
+
+    # Add last updated time at the end, and how old the data is if stale
+    updated = f"{labels['updated']}{format_time(data.last_updated)}"
+    if data.age is not None:
+        updated += f" {labels['stale']}(cached {format_age(data.age)} ago){reset}"
+    right_template.append(updated)
+
+    # Combine left and right content, padding whichever side is shorter
+    rows = max(len(left_content), len(right_template))
+    left_content = left_content + (filler,) * (rows - len(left_content))
+    right_template += [""] * (rows - len(right_template))
+
+    # Full output with separators at the top and bottom
+    return [separator, *map(str.__add__, left_content, right_template), separator]
+
+
+# =============================================================================
+# FORMAT AGE
+# Function to format a number of seconds as a short age like "2h 5m"
+# =============================================================================
+def format_age(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}h {minutes}m"
+    if minutes:
+        return f"{minutes}m"
+    return f"{seconds}s"
+
+
+# =============================================================================
+# RENDER TREND
+# Function to build the sparkline rows for the hourly trend of a report.
+# Forecast trends start at the current hour, history trends end at it. Each
+# series is reduced to at most TREND_WIDTH buckets before drawing.
+# =============================================================================
+TREND_WIDTH = 24
+
+
+def format_trend_period(trend, hours=None):
+    # The hours actually shown, when the data ends before the full span
+    if hours is None:
+        hours = trend["span_hours"]
+    span = f"{hours}h" if hours <= 24 else f"{hours // 24}d"
+    return f"{'next' if trend['source'] == 'forecast' else 'past'} {span}"
+
+
+def render_trend(trend, use_fahrenheit=True, use_color=None, now=None):
+    from bisect import bisect_right
+
+    from utils.series_utils import downsample, sparkline
+
+    if use_color is None:
+        use_color = USE_COLOR
+    labels = RENDER_LABELS[use_color]
+    now = time.time() if now is None else now
+
+    # Select the hours in the window
+    times = trend["time_epoch"]
+    if trend["source"] == "forecast":
+        start = max(bisect_right(times, now) - 1, 0)
+        # The forecast may end before the window does
+        end = min(start + trend["span_hours"], len(times))
+    else:
+        start, end = 0, len(times)
+    if end - start < 2:
+        return []
+
+    if use_fahrenheit:
+        temps, temp_unit, low_field, high_field = (
+            trend["temp_f"][start:end],
+            "°F",
+            "mintemp_f",
+            "maxtemp_f",
+        )
+    else:
+        temps, temp_unit, low_field, high_field = (
+            trend["temp_c"][start:end],
+            "°C",
+            "mintemp_c",
+            "maxtemp_c",
+        )
+
+    # Forecast daily low/high over the days shown, else the series range
+    low, high = min(temps), max(temps)
+    days = trend["days"][: max(trend["span_hours"] // 24, 1)]
+    if days:
+        low = min(day.get(low_field, low) for day in days)
+        high = max(day.get(high_field, high) for day in days)
+
+    period = format_trend_period(
+        trend, end - start if trend["source"] == "forecast" else None
+    )
+    temp_line = sparkline(downsample(temps, TREND_WIDTH), min(temps), max(temps))
+    lines = [
+        f"{labels['trend_temperature'].format(period)}{temp_line} "
+        f"↓{low}{temp_unit} ↑{high}{temp_unit}"
+    ]
+
+    if "precip_mm" in trend:
+        precip = trend["precip_mm"][start:end]
+        rain_line = sparkline(downsample(precip, TREND_WIDTH, "max"), 0)
+        lines.append(
+            f"{labels['trend_rain'].format(period)}{rain_line} "
+            f"{round(sum(precip), 1)} mm, "
+            f"{int(max(trend['chance_of_rain'][start:end]))}% chance"
+        )
+    return lines
+
+
+# =============================================================================
+# WRITE OUTPUT
+# Function to emit a block of text with a single write to the raw stdout,
+# so frames don't tear and don't pay per-line write overhead
+# =============================================================================
+def write_output(text, stream=None):
+    stream = stream or sys.stdout
+
+    with timed("output"):
+        buffer = getattr(stream, "buffer", None)
+        if buffer is None:
+            stream.write(text)
+            stream.flush()
+            return
+
+        # Flush anything already written through the text layer to keep ordering
+        stream.flush()
+        buffer.write(text.encode(stream.encoding or "utf-8", stream.errors or "strict"))
+        buffer.flush()
+
+
+# =============================================================================
+# WEATHER DISPLAY
+# Function to format and display the weather data to terminal
+# =============================================================================
+def display_weather(data, use_fahrenheit=True):
+    write_output(format_panel(data, use_fahrenheit))
+
+
+# =============================================================================
+# FORMAT PANEL
+# Function to render a report as the text of one display panel
+# =============================================================================
+def format_panel(data, use_fahrenheit=True):
+    with timed("render"):
+        return "\n".join(render_weather(data, use_fahrenheit)) + "\n"
+
+
+# =============================================================================
+# WEATHER TABLE
+# Function to render many reports as one compact table, a row per location.
+# Icons, UV and air quality levels are classified for all rows at once from
+# lookup tables, and columns are fitted to the terminal width, dropping the
+# least important ones first when they cannot all fit.
+# =============================================================================
+# Key, header, right aligned, drop order when too narrow (0 = always shown)
+TABLE_COLUMNS = (
+    ("location", "Location", False, 0),
+    ("temp", "Temp", True, 0),
+    ("feels", "Feels", True, 2),
+    ("humidity", "Hum", True, 3),
+    ("wind", "Wind", True, 4),
+    ("uv", "UV", False, 6),
+    ("aqi", "Air", False, 5),
+    ("updated", "Updated", False, 1),
+    ("condition", "Condition", False, 0),
+)
+
+# Gap between columns, and the narrowest the free-text columns may get
+TABLE_GAP = "  "
+TABLE_MIN_WIDTH = 8
+
+# Level lookup tables: UV by upper limit, air quality by US EPA index
+UV_LIMITS = tuple(limit for limit, _, _ in UV_LEVELS)
+UV_CLASSES = tuple((color, label) for _, color, label in UV_LEVELS)
+AIR_QUALITY_CLASSES = (
+    (None, "-"),
+    *AIR_QUALITY_LEVELS,
+    (None, "-"),
+)
+
+
+def classify_table_rows(reports):
+    from utils.series_utils import bucketize, to_column
+
+    # UV levels in one pass over a float column
+    uv_classes = [
+        UV_CLASSES[index]
+        for index in bucketize(to_column(data.uv or 0 for data in reports), UV_LIMITS)
+    ]
+
+    # Air quality: index 1-6, anything else is unknown
+    last = len(AIR_QUALITY_CLASSES) - 1
+    aqi_classes = [
+        AIR_QUALITY_CLASSES[min(max(data.aqi or 0, 0), last)] for data in reports
+    ]
+
+    # Icons for each distinct condition, day/night and moon phase
+    icon_keys = [
+        (data.condition_code, is_daytime(data), data.moon_phase or "")
+        for data in reports
+    ]
+    icons = {key: get_weather_icon(*key) for key in set(icon_keys)}
+    return uv_classes, aqi_classes, [icons[key] for key in icon_keys]
+
+
+def render_table(reports, use_fahrenheit=True, use_color=None, width=None):
+    if use_color is None:
+        use_color = USE_COLOR
+    palette = PALETTES[use_color]
+    if width is None:
+        import shutil
+
+        width = shutil.get_terminal_size((120, 24)).columns
+
+    reports = list(reports)
+    uv_classes, aqi_classes, icons = classify_table_rows(reports)
+    if use_fahrenheit:
+        temp_unit, speed_unit = "°F", "mph"
+    else:
+        temp_unit, speed_unit = "°C", "kph"
+
+    # Plain cell text per column, with the color of each colored cell
+    cells = {
+        "location": [f"{data.name}, {data.country}" for data in reports],
+        "temp": [
+            f"{data.temp_f if use_fahrenheit else data.temp_c}{temp_unit}"
+            for data in reports
+        ],
+        "feels": [
+            f"{data.feelslike_f if use_fahrenheit else data.feelslike_c}{temp_unit}"
+            for data in reports
+        ],
+        "humidity": [f"{data.humidity}%" for data in reports],
+        "wind": [
+            f"{data.wind_mph if use_fahrenheit else data.wind_kph} {speed_unit} "
+            f"{get_wind_direction_arrow(data.wind_degree)}"
+            for data in reports
+        ],
+        "uv": [f"{data.uv} {label}" for data, (_, label) in zip(reports, uv_classes)],
+        "aqi": [label for _, label in aqi_classes],
+        "updated": [
+            (data.last_updated or "")[-5:]
+            + ("" if data.age is None else f" ({format_age(data.age)})")
+            for data in reports
+        ],
+        "condition": [f"{icon}{data.condition}" for data, icon in zip(reports, icons)],
+    }
+    colors = {
+        "uv": [palette[color] for color, _ in uv_classes],
+        "aqi": [palette[color] if color else "" for color, _ in aqi_classes],
+    }
+
+    # Fit to the width: drop optional columns, then shorten the free text
+    columns = list(TABLE_COLUMNS)
+    widths = {
+        key: max([len(header), *map(len, cells[key])]) for key, header, _, _ in columns
+    }
+
+    def total_width():
+        return sum(widths[key] for key, *_ in columns) + len(TABLE_GAP) * (
+            len(columns) - 1
+        )
+
+    for key, *_ in sorted(
+        (column for column in columns if column[3]), key=lambda column: column[3]
+    ):
+        if total_width() <= width:
+            break
+        columns = [column for column in columns if column[0] != key]
+    for key in ("condition", "location"):
+        excess = total_width() - width
+        if excess > 0:
+            widths[key] = max(widths[key] - excess, TABLE_MIN_WIDTH)
+
+    # Header, then one row per report - the last column is never padded
+    bold, reset = palette["BOLD"], palette["RESET"]
+    last_key = columns[-1][0]
+
+    def format_cell(text, key, right):
+        limit = widths[key]
+        if len(text) > limit:
+            text = text[: limit - 1] + "…"
+        if key == last_key:
+            return text
+        return text.rjust(limit) if right else text.ljust(limit)
+
+    lines = [
+        bold
+        + TABLE_GAP.join(
+            format_cell(header, key, right) for key, header, right, _ in columns
+        ).rstrip()
+        + reset
+    ]
+    for index in range(len(reports)):
+        row = []
+        for key, _, right, _ in columns:
+            text = format_cell(cells[key][index], key, right)
+            color = colors[key][index] if key in colors else ""
+            row.append(f"{color}{text}{reset}" if color else text)
+        lines.append(TABLE_GAP.join(row))
+    return lines
+
+
+# =============================================================================
+# OUTPUT FORMATS
+# Machine-readable alternatives to the colored display panel
+# =============================================================================
+OUTPUT_FORMATS = ("text", "table", "json", "ndjson", "csv")
+
+# Fields of a structured weather record, in CSV column order
+RECORD_FIELDS = [
+    "query",
+    "name",
+    "region",
+    "country",
+    "lat",
+    "lon",
+    "last_updated",
+    "last_updated_epoch",
+    "condition",
+    "condition_code",
+    "is_day",
+    "temp_c",
+    "temp_f",
+    "feelslike_c",
+    "feelslike_f",
+    "humidity",
+    "wind_kph",
+    "wind_mph",
+    "wind_degree",
+    "wind_dir",
+    "pressure_mb",
+    "vis_miles",
+    "uv",
+    "aqi",
+    "moon_phase",
+    "stale_age",
+]
+
+
+# =============================================================================
+# BUILD WEATHER RECORD
+# Function to flatten a weather report into a structured record, skipping
+# all of the logo and color work done by display_weather
+# =============================================================================
+def build_weather_record(data, query=None):
+    return {
+        "query": query,
+        "name": data.name,
+        "region": data.region,
+        "country": data.country,
+        "lat": data.lat,
+        "lon": data.lon,
+        "last_updated": data.last_updated,
+        "last_updated_epoch": data.last_updated_epoch,
+        "condition": data.condition,
+        "condition_code": data.condition_code,
+        "is_day": is_daytime(data),
+        "temp_c": data.temp_c,
+        "temp_f": data.temp_f,
+        "feelslike_c": data.feelslike_c,
+        "feelslike_f": data.feelslike_f,
+        "humidity": data.humidity,
+        "wind_kph": data.wind_kph,
+        "wind_mph": data.wind_mph,
+        "wind_degree": data.wind_degree,
+        "wind_dir": data.wind_dir,
+        "pressure_mb": data.pressure_mb,
+        "vis_miles": data.vis_miles,
+        "uv": data.uv,
+        "aqi": data.aqi,
+        "moon_phase": data.moon_phase,
+        # Seconds since the data was fetched, when served past its TTL
+        "stale_age": None if data.age is None else round(data.age),
+    }
+
+
+# =============================================================================
+# WRITE WEATHER RECORDS
+# Function to stream records to stdout in json, ndjson or csv format.
+# ndjson and csv write (and flush) each record as soon as it arrives; json
+# has to wait for the whole list.
+# =============================================================================
+def write_weather_records(
+    records, output_format, stream=None, fieldnames=RECORD_FIELDS
+):
+    stream = stream or sys.stdout
+
+    if output_format == "json":
+        json.dump(list(records), stream, indent=2)
+        stream.write("\n")
+    elif output_format == "ndjson":
+        for record in records:
+            stream.write(json.dumps(record) + "\n")
+            stream.flush()
+    elif output_format == "csv":
+        import csv
+
+        writer = csv.DictWriter(stream, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            stream.flush()
+    else:
+        raise ValueError(f"unknown output format: {output_format}")
+
+
+# =============================================================================
+# HISTORY SUMMARY
+# Functions to summarize stored observations over a time range, read from
+# the local history instead of the API
+# =============================================================================
+# (metric, imperial column and unit, metric column and unit)
+HISTORY_METRICS = (
+    ("temperature", "temp_f", "°F", "temp_c", "°C"),
+    ("feels_like", "feelslike_f", "°F", "feelslike_c", "°C"),
+    ("humidity", "humidity", "%", "humidity", "%"),
+    ("pressure", "pressure_mb", "mb", "pressure_mb", "mb"),
+    ("wind", "wind_mph", "mph", "wind_kph", "kph"),
+    ("uv", "uv", "", "uv", ""),
+    ("aqi", "aqi", "/6", "aqi", "/6"),
+)
+
+HISTORY_LABELS = {
+    "temperature": "Temperature",
+    "feels_like": "Feels like",
+    "humidity": "Humidity",
+    "pressure": "Pressure",
+    "wind": "Wind",
+    "uv": "UV Index",
+    "aqi": "Air Quality",
+}
+
+HISTORY_FIELDS = [
+    "query",
+    "name",
+    "metric",
+    "unit",
+    "min",
+    "max",
+    "avg",
+    "count",
+    "from",
+    "to",
+]
+
+# Suffixes accepted by --since/--until, in seconds
+DURATION_UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+
+
+def parse_time_arg(value):
+    # "30m", "24h", "7d", "2w" ago, or a local ISO date/time
+    value = value.strip()
+    unit = DURATION_UNITS.get(value[-1:].lower())
+    if unit is not None and value[:-1].isdigit():
+        return time.time() - int(value[:-1]) * unit
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected a duration like 24h or 7d, or a date like 2024-10-18: {value!r}"
+        )
+
+
+def format_epoch(epoch):
+    return datetime.fromtimestamp(epoch).strftime("%Y-%m-%d %H:%M")
+
+
+def build_history_records(summary, query, use_fahrenheit=True):
+    records = []
+    for metric, imperial_column, imperial_unit, column, unit in HISTORY_METRICS:
+        if use_fahrenheit:
+            column, unit = imperial_column, imperial_unit
+        low, high, average, count = summary["metrics"][column]
+        records.append(
+            {
+                "query": query,
+                "name": summary["name"],
+                "metric": metric,
+                "unit": unit,
+                "min": low,
+                "max": high,
+                "avg": None if average is None else round(average, 1),
+                "count": count,
+                "from": format_epoch(summary["first"]),
+                "to": format_epoch(summary["last"]),
+            }
+        )
+    return records
+
+
+def render_history(summary, records):
+    bold, reset = COLORS["BOLD"], COLORS["RESET"]
+    place = ", ".join(
+        part
+        for part in (summary["name"], summary["region"], summary["country"])
+        if part
+    )
+    lines = [
+        f"{bold}{COLORS['CYAN']}{place}{reset} - {summary['count']} observations "
+        f"from {format_epoch(summary['first'])} to {format_epoch(summary['last'])}",
+        f"{bold}{'':<20}{'min':>10}{'max':>10}{'avg':>10}{reset}",
+    ]
+    for record in records:
+        label = HISTORY_LABELS[record["metric"]]
+        if record["unit"]:
+            label += f" ({record['unit']})"
+        values = (
+            "-" if value is None else value
+            for value in map(record.get, ("min", "max", "avg"))
+        )
+        lines.append(f"{label:<20}" + "".join(f"{value:>10}" for value in values))
+    return lines
+
+
+def show_history(
+    locations, start, end, use_fahrenheit=True, cache=None, output_format="text"
+):
+    from history import HistoryStore
+
+    store = HistoryStore(_history_path or DEFAULT_HISTORY_PATH)
+    columns = sorted(
+        {
+            column
+            for _, imperial, _, metric, _ in HISTORY_METRICS
+            for column in (imperial, metric)
+        }
+    )
+
+    frames = []
+    records = []
+    missing = []
+    try:
+        for location in locations:
+            summary = store.summarize(
+                resolve_location(location, cache),
+                location.split(",")[0].strip(),
+                start,
+                end,
+                columns,
+            )
+            if not summary["count"]:
+                missing.append(location)
+                print(
+                    f"{COLORS['YELLOW']}No observations stored for {location} between "
+                    f"{format_epoch(start)} and {format_epoch(end)}{COLORS['RESET']}",
+                    file=sys.stderr,
+                )
+                continue
+            location_records = build_history_records(summary, location, use_fahrenheit)
+            records.extend(location_records)
+            frames.append("\n".join(render_history(summary, location_records)) + "\n")
+    finally:
+        store.close()
+
+    if output_format in ("text", "table"):
+        write_output("\n".join(frames))
+    else:
+        write_weather_records(records, output_format, fieldnames=HISTORY_FIELDS)
+
+    # Exit with error code if any location has no history
+    if missing:
+        sys.exit(1)
+
+
+# =============================================================================
+# NEXT CURRENT FETCH
+# Function to decide when current conditions could plausibly have changed,
+# based on the last_updated_epoch the API reported
+# =============================================================================
+def get_next_current_fetch(weather_data, now, interval):
+    last_updated = weather_data.get("current", {}).get("last_updated_epoch")
+    if last_updated is None:
+        return now + interval
+    # Poll every interval once an update is due but has not shown up yet
+    return max(now + interval, last_updated + CURRENT_UPDATE_INTERVAL)
+
+
+# =============================================================================
+# REDRAW SCREEN
+# Function to update a terminal frame in place, rewriting only changed lines
+# =============================================================================
+def redraw_screen(previous_lines, lines, stream=None):
+    stream = stream or sys.stdout
+
+    # Not a terminal - just append the new frame
+    if not stream.isatty():
+        write_output("\n".join(lines) + "\n", stream)
+        return
+
+    if len(previous_lines) != len(lines):
+        # Frame shape changed - clear the screen and draw everything
+        output = "\x1b[H\x1b[2J" + "\n".join(lines) + "\n"
+    else:
+        # Move the cursor to each changed line, clear it and rewrite it
+        output = "".join(
+            f"\x1b[{row};1H\x1b[2K{line}"
+            for row, (old, line) in enumerate(zip(previous_lines, lines), start=1)
+            if old != line
+        )
+        # Park the cursor below the frame
+        output += f"\x1b[{len(lines) + 1};1H"
+
+    write_output(output, stream)
+
+
+# =============================================================================
+# WATCH WEATHER
+# Function to keep one process alive and refresh the display every interval.
+# Astronomy data is fetched once per day and current conditions only once
+# the API could have published an update. The screen is only touched when
+# the rendered output actually changes.
+# =============================================================================
+def watch_weather(
+    api_key,
+    location,
+    interval,
+    use_fahrenheit=True,
+    cache=None,
+    current_ttl=DEFAULT_CURRENT_TTL,
+    trend_days=0,
+):
+    query = resolve_location(location, cache)
+    weather_data = astronomy_data = trend_data = None
+    astronomy_day = None
+    next_current_fetch = next_trend_fetch = 0
+    # When weather_data was fetched, to mark it with its age once it is stale
+    weather_fetched_at = None
+    previous_lines = []
+
+    while True:
+        now = datetime.now()
+        today = now.strftime("%Y-%m-%d")
+        weather_url, _ = build_request_urls(api_key, location, today)
+        error = None
+
+        try:
+            # Current conditions only once they could have been updated
+            if now.timestamp() >= next_current_fetch:
+                current_key = ["current", query, today]
+                fresh_data = None
+                fetched_at = now.timestamp()
+                if weather_data is None and cache is not None:
+                    # Cached by an earlier run - age it from when it was stored
+                    entry = cache.get_entry(current_key)
+                    if entry is not None and entry["expires_at"] > fetched_at:
+                        fresh_data = entry["data"]
+                        fetched_at = entry.get("stored_at", fetched_at)
+                if fresh_data is None:
+                    fresh_data = fetch_and_cache(
+                        weather_url,
+                        project_current_response,
+                        cache,
+                        current_key,
+                        now.timestamp() + current_ttl,
+                    )
+                weather_data = fresh_data
+                weather_fetched_at = fetched_at
+                next_current_fetch = get_next_current_fetch(
+                    weather_data, now.timestamp(), interval
+                )
+
+            # Astronomy data only changes once a day - the sunrise and sunset
+            # of the date at the location, refetched when it or ours rolls over
+            local_time = get_local_time(weather_data["location"].get("tz_id"), now)
+            day = (today, local_time.strftime("%Y-%m-%d") if local_time else today)
+            if astronomy_day != day:
+                midnight = datetime.combine(
+                    now.date() + timedelta(days=1), datetime.min.time()
+                )
+                astronomy_key = ["astronomy", query, today]
+                # Reuse what another run cached on the first pass only
+                astronomy_data = (
+                    cache.get(astronomy_key)
+                    if cache and astronomy_day is None
+                    else None
+                )
+                if astronomy_data is None:
+                    _, astronomy_url = build_request_urls(api_key, location, day[1])
+                    astronomy_data = fetch_and_cache(
+                        astronomy_url,
+                        project_astronomy_response,
+                        cache,
+                        astronomy_key,
+                        midnight.timestamp(),
+                    )
+                astronomy_day = day
+
+            # Hourly trend only as often as the forecast changes
+            if trend_days and now.timestamp() >= next_trend_fetch:
+                trend_entry = get_trend_entry(
+                    (["current", query, today], None), now, trend_days
+                )
+                trend_data = (
+                    cache.get(trend_entry[0]) if cache else None
+                ) or fetch_trend(api_key, location, trend_days, cache, trend_entry)
+                next_trend_fetch = trend_entry[1]
+        except Exception as e:
+            error = e
+            next_current_fetch = now.timestamp() + interval
+
+            # Nothing to show yet - fall back to recent cached data
+            if cache is not None and weather_data is None:
+                entry = get_stale_entry(cache, ["current", query, today], now)
+                if entry is not None:
+                    weather_data = entry["data"]
+                    weather_fetched_at = entry.get("stored_at", now.timestamp())
+            if cache is not None and astronomy_data is None:
+                entry = get_stale_entry(cache, ["astronomy", query, today], now)
+                if entry is not None:
+                    astronomy_data = entry["data"]
+
+        # Render the latest data, keeping the last good frame on errors
+        lines = []
+        if weather_data is not None and astronomy_data is not None:
+            data = combine_weather_data(weather_data, astronomy_data, trend_data)
+            if now.timestamp() - weather_fetched_at > current_ttl:
+                data.age = now.timestamp() - weather_fetched_at
+            with timed("render"):
+                lines = render_weather(data, use_fahrenheit)
+        if error is not None:
+            lines.append(
+                f"{COLORS['RED']}Update failed: {describe_error(error)}"
+                f"{COLORS['RESET']}"
+            )
+
+        if lines != previous_lines:
+            redraw_screen(previous_lines, lines)
+            previous_lines = lines
+
+        time.sleep(interval)
+
+
+# =============================================================================
+# WARM LOCATIONS
+# Function to fetch many locations into the cache ahead of time, reporting
+# how many distinct places they resolved to
+# =============================================================================
+def warm_locations(
+    api_key,
+    locations,
+    max_workers=DEFAULT_WORKERS,
+    cache=None,
+    current_ttl=DEFAULT_CURRENT_TTL,
+    strategy=DEFAULT_FETCH_STRATEGY,
+):
+    places = set()
+    failures = []
+    for location, data, error in get_weather_batch(
+        api_key, locations, max_workers, cache, current_ttl, strategy, ordered=False
+    ):
+        if error is not None:
+            failures.append(location)
+            print(
+                f"{COLORS['RED']}Error fetching weather data for {location}: "
+                f"{describe_error(error)}{COLORS['RESET']}",
+                file=sys.stderr,
+            )
+            continue
+        canonical = get_canonical_location({"lat": data.lat, "lon": data.lon})
+        places.add(canonical["key"] if canonical else normalize_location(location))
+
+    print(
+        f"Indexed {len(locations) - len(failures)} locations as {len(places)} "
+        f"distinct places ({len(failures)} failed)"
+    )
+    if failures:
+        sys.exit(1)
+
+
+# =============================================================================
+# PREFETCH LOCATIONS
+# Function to keep the cache warm for a fixed set of locations until
+# interrupted. Current conditions are refreshed every interval seconds, with
+# the locations spread evenly over the interval so requests never arrive in
+# one burst. Astronomy is refreshed once per local day of each location,
+# using the tz_id the API returns - it only holds that day's sunrise and
+# sunset, so day or night is still decided at lookup time. Entries are
+# written to outlive the interval, so lookups in between are cache hits.
+# =============================================================================
+# Extra seconds prefetched entries stay fresh past the next refresh
+PREFETCH_GRACE = 60
+
+
+def get_local_date(tz_id, now):
+    # Date at a location, or here if its time zone is unknown
+    return (get_local_time(tz_id, now) or now).strftime("%Y-%m-%d")
+
+
+def prefetch_location(api_key, location, cache, current_ttl, astronomy_days):
+    now = datetime.now()
+    today = now.strftime("%Y-%m-%d")
+    current_entry, astronomy_entry = get_cache_entries(
+        location, now, current_ttl, cache
+    )
+    weather_url, _ = build_request_urls(api_key, location, today)
+    weather_data = fetch_and_cache(
+        weather_url, project_current_response, cache, *current_entry, PRIORITY_BATCH
+    )
+
+    # Astronomy once per day here (the cache key) and there (the data)
+    tz_id = weather_data.get("location", {}).get("tz_id")
+    day = (today, get_local_date(tz_id, now))
+    if astronomy_days.get(location) == day:
+        return
+    if location not in astronomy_days and cache.get(astronomy_entry[0]) is not None:
+        # Cached by an earlier run today
+        astronomy_days[location] = day
+        return
+    _, astronomy_url = build_request_urls(api_key, location, day[1])
+    fetch_and_cache(
+        astronomy_url,
+        project_astronomy_response,
+        cache,
+        *astronomy_entry,
+        PRIORITY_BATCH,
+    )
+    astronomy_days[location] = day
+
+
+def prefetch_locations(
+    api_key,
+    locations,
+    interval,
+    max_workers=DEFAULT_WORKERS,
+    cache=None,
+    current_ttl=DEFAULT_CURRENT_TTL,
+):
+    import heapq
+    from concurrent.futures import ThreadPoolExecutor
+
+    current_ttl = max(current_ttl, interval + PREFETCH_GRACE)
+    astronomy_days = {}
+    # Locations being refreshed, and when each place was last refreshed so
+    # several names for one place are only fetched once per interval
+    in_flight = set()
+    refreshed_at = {}
+    counts = {"refreshed": 0, "failed": 0}
+    lock = threading.Lock()
+
+    def refresh(location):
+        try:
+            prefetch_location(api_key, location, cache, current_ttl, astronomy_days)
+            outcome = "refreshed"
+        except Exception as e:
+            outcome = "failed"
+            print(
+                f"{COLORS['RED']}Error prefetching weather data for {location}: "
+                f"{describe_error(e)}{COLORS['RESET']}",
+                file=sys.stderr,
+            )
+        with lock:
+            counts[outcome] += 1
+            in_flight.discard(location)
+
+    # First refresh of each location staggered across one interval
+    start = time.monotonic()
+    step = interval / len(locations)
+    queue = [(start + index * step, index) for index in range(len(locations))]
+    next_report = start + interval
+
+    print(
+        f"Prefetching {len(locations)} locations every {interval:g}s "
+        f"with {max_workers} workers",
+        flush=True,
+    )
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        while True:
+            now = time.monotonic()
+            while queue[0][0] <= now:
+                due, index = heapq.heappop(queue)
+                heapq.heappush(queue, (due + interval, index))
+                location = locations[index]
+                query = resolve_location(location, cache)
+                with lock:
+                    if location in in_flight:
+                        continue
+                    if now - refreshed_at.get(query, now - interval) < interval / 2:
+                        continue
+                    in_flight.add(location)
+                    refreshed_at[query] = now
+                executor.submit(refresh, location)
+
+            # One summary line per interval
+            if now >= next_report:
+                with lock:
+                    refreshed, failed = counts["refreshed"], counts["failed"]
+                    counts["refreshed"] = counts["failed"] = 0
+                print(
+                    f"{datetime.now():%H:%M:%S} Refreshed {refreshed} locations "
+                    f"({failed} failed)",
+                    flush=True,
+                )
+                next_report += interval
+
+            time.sleep(max(min(queue[0][0], next_report) - time.monotonic(), 0))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# =============================================================================
+# SERVE WEATHER
+# Function to run the local HTTP service, exposing /weather?q=LOCATION as JSON
+# (or rendered text with &format=text) from one warm process
+# =============================================================================
+def serve_weather(
+    api_key,
+    host,
+    port,
+    use_fahrenheit=True,
+    cache=None,
+    current_ttl=DEFAULT_CURRENT_TTL,
+    strategy=DEFAULT_FETCH_STRATEGY,
+    max_workers=DEFAULT_WORKERS,
+):
+    # Imported here so one-shot lookups don't pay for asyncio
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+
+    from server import WeatherServer
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    memory_cache = MemoryCache(DEFAULT_CACHE_ENTRIES)
+    if _timings is not None:
+        from utils.timing_utils import TimedCache
+
+        memory_cache = TimedCache(memory_cache, _timings, "memory_cache")
+    server = WeatherServer(
+        submit=lambda location: submit_weather_requests(
+            executor, api_key, location, cache, current_ttl, strategy
+        ),
+        render=lambda data: render_weather(data, use_fahrenheit),
+        serialize=build_weather_record,
+        normalize=lambda location: resolve_location(location, cache),
+        cache=memory_cache,
+        ttl=current_ttl,
+        # Stale reports are being refreshed - look them up again next time
+        is_stale=lambda data: data.age is not None,
+        metrics=get_metrics if _timings is not None else None,
+    )
+
+    print(f"Serving weather on http://{host}:{port}/weather?q=LOCATION")
+    if _timings is not None:
+        print(f"Timings on http://{host}:{port}/metrics (?format=json for JSON)")
+    try:
+        asyncio.run(server.serve_forever(host, port))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# =============================================================================
+# GET METRICS
+# Function to render the timings collected so far for the /metrics route,
+# in Prometheus text format unless another format is asked for
+# =============================================================================
+def get_metrics(output_format=""):
+    if output_format == "json":
+        return _timings.format_json(), "application/json"
+    if output_format == "text":
+        return _timings.format_text(), "text/plain; charset=utf-8"
+    return (
+        _timings.format_prometheus(METRICS_PREFIX),
+        "text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+# =============================================================================
+# MAIN - Entry point of the program
+# =============================================================================
+def main():
+    # Set up command line argument parsing
+    parser = argparse.ArgumentParser(
+        description="Weather CLI - Display weather information in a terminal"
+    )
+    parser.add_argument(
+        "location",
+        nargs="*",
+        help="Location(s) (city name, ZIP code, coordinates)",
+    )
+    parser.add_argument(
+        "--celsius",
+        "-c",
+        action="store_true",
+        help="Display temperature in Celsius",
+    )
+    parser.add_argument(
+        "--file",
+        "-f",
+        metavar="PATH",
+        help='Read additional locations from a file, one per line ("-" for stdin)',
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="Only fetch the given locations into the location index and cache, "
+        "without displaying them (e.g. --warm -f locations.txt)",
+    )
+    parser.add_argument(
+        "--prefetch",
+        type=float,
+        metavar="INTERVAL",
+        help="Keep running and refresh the given locations into the cache every "
+        "INTERVAL seconds, staggered across the interval "
+        "(e.g. --prefetch 300 -f locations.txt)",
+    )
+    parser.add_argument(
+        "--workers",
+        "-w",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"Maximum concurrent requests in batch mode (default: {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="text",
+        help="Output format: text panels, a compact table with one row per "
+        "location, or json/ndjson/csv records (default: text)",
+    )
+    parser.add_argument(
+        "--watch",
+        type=float,
+        metavar="INTERVAL",
+        help="Keep running and refresh the display every INTERVAL seconds",
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a local HTTP service exposing /weather?q=LOCATION as JSON",
+    )
+    parser.add_argument(
+        "--host",
+        default=DEFAULT_SERVE_HOST,
+        help=f"Address for --serve to listen on (default: {DEFAULT_SERVE_HOST})",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=DEFAULT_SERVE_PORT,
+        help=f"Port for --serve to listen on (default: {DEFAULT_SERVE_PORT})",
+    )
+    parser.add_argument(
+        "--api-key",
+        help="WeatherAPI key, or several separated by commas (default: the "
+        "WEATHER_API_KEYS or WEATHER_API_KEY environment variable, then the "
+        ".env file)",
+    )
+    parser.add_argument(
+        "--timings",
+        nargs="?",
+        const="text",
+        default=DEFAULT_TIMINGS,
+        choices=TIMING_FORMATS,
+        help="Print time spent per phase (requests, decoding, cache, rendering), "
+        "response sizes and cache hits to stderr on exit, as text, json or "
+        "prometheus; --serve also exposes them on /metrics (env: WEATHER_TIMINGS)",
+    )
+    parser.add_argument(
+        "--timings-file",
+        metavar="PATH",
+        help="Write the --timings output to this file instead of stderr",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="Run under cProfile and write the stats to PATH "
+        "(read them with python -m pstats PATH)",
+    )
+    parser.add_argument(
+        "--key-stats",
+        action="store_true",
+        help="Print requests and ejections per API key on exit",
+    )
+    parser.add_argument(
+        "--env-file",
+        default=DEFAULT_ENV_FILE,
+        metavar="PATH",
+        help="File to read WEATHER_API_KEY from (env: WEATHER_ENV_FILE, "
+        "default: ./.env, else the .env in the project root)",
+    )
+    parser.add_argument(
+        "--fetch-strategy",
+        choices=FETCH_STRATEGIES,
+        default=DEFAULT_FETCH_STRATEGY,
+        help="forecast: one forecast.json call per lookup; split: separate "
+        "current.json and astronomy.json calls (env: WEATHER_FETCH_STRATEGY, "
+        f"default: {DEFAULT_FETCH_STRATEGY})",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="DIR",
+        help="Save every raw API response to DIR for later --replay "
+        "(use with --refresh to record locations that are already cached)",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="DIR",
+        help="Serve API responses recorded with --record from a local stand-in "
+        "server instead of api.weatherapi.com",
+    )
+    parser.add_argument(
+        "--replay-latency",
+        type=float,
+        default=0.0,
+        metavar="SECONDS",
+        help="Latency added to every replayed response",
+    )
+    parser.add_argument(
+        "--replay-error-rate",
+        type=float,
+        default=0.0,
+        metavar="RATE",
+        help="Fraction of replayed requests answered with a 503 (0-1)",
+    )
+    parser.add_argument(
+        "--replay-seed",
+        type=int,
+        help="Random seed so injected replay errors are reproducible",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=HTTP_SETTINGS["read_timeout"],
+        metavar="SECONDS",
+        help="Read timeout for API requests (env: WEATHER_READ_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=HTTP_SETTINGS["connect_timeout"],
+        metavar="SECONDS",
+        help="Connect timeout for API requests (env: WEATHER_CONNECT_TIMEOUT)",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=HTTP_SETTINGS["retries"],
+        help="Retries on connection errors, 429 and 5xx (env: WEATHER_HTTP_RETRIES)",
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        default=HTTP_SETTINGS["backoff"],
+        metavar="FACTOR",
+        help="Exponential backoff factor between retries (env: WEATHER_HTTP_BACKOFF)",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        help="Keep-alive connections to the API (env: WEATHER_HTTP_POOL_SIZE, "
+        "default: at least --workers)",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=RATE_LIMIT_SETTINGS["rate"],
+        metavar="PER_SECOND",
+        help="Maximum API requests per second per API key (env: WEATHER_RATE_LIMIT)",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=RATE_LIMIT_SETTINGS["burst"],
+        help="Requests that may be sent at once before --rate-limit applies "
+        "(env: WEATHER_RATE_BURST, default: 1)",
+    )
+    parser.add_argument(
+        "--max-concurrent",
+        type=int,
+        default=RATE_LIMIT_SETTINGS["max_concurrent"],
+        metavar="N",
+        help="Maximum API requests in flight (env: WEATHER_MAX_CONCURRENT)",
+    )
+    parser.add_argument(
+        "--monthly-budget",
+        type=int,
+        default=RATE_LIMIT_SETTINGS["monthly_budget"],
+        metavar="REQUESTS",
+        help="API requests allowed per calendar month per API key; usage is "
+        "tracked in the cache directory (env: WEATHER_MONTHLY_BUDGET)",
+    )
+    parser.add_argument(
+        "--budget-reserve",
+        type=float,
+        default=RATE_LIMIT_SETTINGS["budget_reserve"],
+        metavar="FRACTION",
+        help="Share of the monthly budget kept for interactive lookups; once "
+        "only the reserve is left, expired cached data is served where possible "
+        "(env: WEATHER_BUDGET_RESERVE, default: "
+        f"{RATE_LIMIT_SETTINGS['budget_reserve']})",
+    )
+    parser.add_argument(
+        "--trend",
+        action="store_true",
+        help="Add temperature and rain sparklines from the hourly forecast, or "
+        "from the local history when the forecast is not available",
+    )
+    parser.add_argument(
+        "--trend-days",
+        type=int,
+        default=1,
+        metavar="DAYS",
+        help="Days of hourly forecast shown by --trend "
+        f"(1-{MAX_FORECAST_DAYS}, default: 1)",
+    )
+    parser.add_argument(
+        "--history",
+        action="store_true",
+        help="Print min/max/avg of the locally stored observations for each "
+        "location instead of fetching (see --since/--until)",
+    )
+    parser.add_argument(
+        "--since",
+        type=parse_time_arg,
+        metavar="WHEN",
+        help="Start of the --history range: a duration ago (30m, 24h, 7d, 2w) "
+        "or a date/time like 2024-10-18T06:00 (default: 24h)",
+    )
+    parser.add_argument(
+        "--until",
+        type=parse_time_arg,
+        metavar="WHEN",
+        help="End of the --history range, in the same forms as --since "
+        "(default: now)",
+    )
+    parser.add_argument(
+        "--no-history",
+        action="store_true",
+        help="Do not store fetched observations in the local history",
+    )
+    parser.add_argument(
+        "--history-db",
+        default=DEFAULT_HISTORY_PATH,
+        metavar="PATH",
+        help=f"SQLite file for observation history (env: WEATHER_HISTORY_DB, "
+        f"default: {DEFAULT_HISTORY_PATH})",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the local response cache",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached responses but store the fresh ones",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=DEFAULT_CURRENT_TTL,
+        metavar="SECONDS",
+        help=f"How long current conditions stay cached (default: {DEFAULT_CURRENT_TTL})",
+    )
+    parser.add_argument(
+        "--cache-entries",
+        type=int,
+        default=DEFAULT_CACHE_ENTRIES,
+        metavar="N",
+        help="Maximum number of cached responses kept on disk "
+        f"(env: WEATHER_CACHE_ENTRIES, default: {DEFAULT_CACHE_ENTRIES})",
+    )
+    parser.add_argument(
+        "--stale-window",
+        type=int,
+        default=STALE_SETTINGS["revalidate_window"],
+        metavar="SECONDS",
+        help="Show cached data up to this long past --cache-ttl at once and "
+        "refresh it in the background (env: WEATHER_STALE_WINDOW, default: "
+        f"{STALE_SETTINGS['revalidate_window']})",
+    )
+    parser.add_argument(
+        "--max-staleness",
+        type=int,
+        default=STALE_SETTINGS["max_staleness"],
+        metavar="SECONDS",
+        help="When the API fails or is slow, show cached data up to this long "
+        "past --cache-ttl instead; 0 disables stale data (env: "
+        f"WEATHER_MAX_STALENESS, default: {STALE_SETTINGS['max_staleness']})",
+    )
+    parser.add_argument(
+        "--stale-timeout",
+        type=float,
+        default=STALE_SETTINGS["timeout"],
+        metavar="SECONDS",
+        help="How long to wait for the API before showing stale data "
+        f"(env: WEATHER_STALE_TIMEOUT, default: {STALE_SETTINGS['timeout']})",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=DEFAULT_CACHE_DIR,
+        metavar="PATH",
+        help=f"Directory for cached responses (default: {DEFAULT_CACHE_DIR})",
+    )
+
+    # Parse the command line arguments
+    args = parser.parse_args()
+
+    # Collect locations from the command line and the optional file
+    locations = list(args.location)
+    if args.file:
+        try:
+            locations.extend(read_locations_file(args.file))
+        except (OSError, UnicodeDecodeError) as e:
+            parser.error(f"cannot read locations file {args.file}: {e}")
+    if not locations and not args.serve:
+        parser.error("at least one location is required")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.watch is not None:
+        if len(locations) != 1:
+            parser.error("--watch takes exactly one location")
+        if args.watch <= 0:
+            parser.error("--watch INTERVAL must be positive")
+        if args.format != "text":
+            parser.error("--watch only supports --format text")
+    if args.history and (args.serve or args.watch is not None or args.warm):
+        parser.error("--history cannot be combined with --serve/--watch/--warm")
+    if (args.since is not None or args.until is not None) and not args.history:
+        parser.error("--since/--until only apply to --history")
+    if args.trend and (args.format != "text" or args.serve or args.warm):
+        parser.error("--trend only supports --format text, without --serve/--warm")
+    if not 1 <= args.trend_days <= MAX_FORECAST_DAYS:
+        parser.error(f"--trend-days must be between 1 and {MAX_FORECAST_DAYS}")
+    if args.prefetch is not None:
+        if args.prefetch <= 0:
+            parser.error("--prefetch INTERVAL must be positive")
+        if args.no_cache or args.serve or args.watch is not None or args.warm:
+            parser.error(
+                "--prefetch needs the cache and cannot be combined with "
+                "--serve/--watch/--warm"
+            )
+        if args.history or args.trend:
+            parser.error("--prefetch cannot be combined with --history/--trend")
+    if args.warm and (args.no_cache or args.serve or args.watch is not None):
+        parser.error(
+            "--warm needs the cache and cannot be combined with --serve/--watch"
+        )
+
+    if args.record and args.replay:
+        parser.error("--record and --replay cannot be combined")
+    if not 0 <= args.replay_error_rate <= 1:
+        parser.error("--replay-error-rate must be between 0 and 1")
+    if args.rate_limit is not None and args.rate_limit <= 0:
+        parser.error("--rate-limit must be positive")
+    if args.burst < 1:
+        parser.error("--burst must be at least 1")
+    if args.max_concurrent is not None and args.max_concurrent < 1:
+        parser.error("--max-concurrent must be at least 1")
+    if args.monthly_budget is not None and args.monthly_budget < 1:
+        parser.error("--monthly-budget must be at least 1")
+    if not 0 <= args.budget_reserve < 1:
+        parser.error("--budget-reserve must be between 0 and 1")
+    if args.cache_entries < 1:
+        parser.error("--cache-entries must be at least 1")
+    if args.stale_window < 0 or args.max_staleness < 0 or args.stale_timeout < 0:
+        parser.error(
+            "--stale-window/--max-staleness/--stale-timeout must not be negative"
+        )
+
+    # Apply HTTP settings before the shared session is created
+    HTTP_SETTINGS["read_timeout"] = args.timeout
+    HTTP_SETTINGS["connect_timeout"] = args.connect_timeout
+    HTTP_SETTINGS["retries"] = args.retries
+    HTTP_SETTINGS["backoff"] = args.backoff
+
+    # Apply the stale-while-revalidate policy; the window never outlasts
+    # how stale data may get
+    STALE_SETTINGS["max_staleness"] = args.max_staleness
+    STALE_SETTINGS["revalidate_window"] = min(args.stale_window, args.max_staleness)
+    STALE_SETTINGS["timeout"] = args.stale_timeout
+    if args.pool_size is not None:
+        HTTP_SETTINGS["pool_size"] = args.pool_size
+    else:
+        HTTP_SETTINGS["pool_size"] = max(HTTP_SETTINGS["pool_size"], args.workers)
+
+    # Record raw responses, or replay recorded ones from a local server
+    global API_BASE_URL, _recorder
+    replay_server = None
+    replay_cache_dir = None
+    if args.record:
+        from replay import Recorder
+
+        _recorder = Recorder(args.record)
+    if args.replay:
+        from replay import ReplayServer
+
+        replay_server = ReplayServer(
+            args.replay,
+            latency=args.replay_latency,
+            error_rate=args.replay_error_rate,
+            seed=args.replay_seed,
+        ).start()
+        API_BASE_URL = replay_server.base_url
+
+        # Keep replayed data out of the real response cache and history, in
+        # a temporary directory rather than next to the (often checked in)
+        # fixtures
+        replay_cache = args.cache_dir == DEFAULT_CACHE_DIR
+        replay_history = args.history_db == DEFAULT_HISTORY_PATH
+        if replay_cache or replay_history:
+            import tempfile
+
+            replay_cache_dir = tempfile.mkdtemp(prefix="weather-replay-")
+        if replay_cache:
+            args.cache_dir = replay_cache_dir
+        if replay_history:
+            args.history_db = os.path.join(replay_cache_dir, "history.sqlite3")
+
+    # Keep every fetched observation in the local history
+    global _history_path
+    if not args.no_history:
+        _history_path = args.history_db
+
+    # Time every phase of the run with --timings
+    global _timings
+    if args.timings is not None:
+        from utils.timing_utils import Timings
+
+        _timings = Timings()
+    started = time.perf_counter_ns()
+
+    # Spread requests over every key given - history mode needs none
+    global _key_pool
+    with timed("env"):
+        api_keys = [] if args.history else load_api_keys(args.api_key, args.env_file)
+    if len(api_keys) > 1:
+        from utils.rate_limit_utils import ApiKeyPool
+
+        _key_pool = ApiKeyPool(api_keys)
+    key_count = max(len(api_keys), 1)
+
+    # Stay within the plan's rate limits and monthly budget, for every key
+    global _scheduler, _quota
+    if args.rate_limit is not None or args.max_concurrent is not None:
+        from utils.rate_limit_utils import RequestScheduler
+
+        _scheduler = RequestScheduler(
+            rate=args.rate_limit and args.rate_limit * key_count,
+            burst=args.burst * key_count,
+            max_concurrent=args.max_concurrent,
+        )
+    if args.monthly_budget is not None:
+        from utils.rate_limit_utils import MonthlyQuota
+
+        budget = args.monthly_budget * key_count
+        _quota = MonthlyQuota(
+            os.path.join(args.cache_dir, "quota"),
+            budget,
+            reserve=int(budget * args.budget_reserve),
+        )
+
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        run(args, locations, api_keys)
+    finally:
+        # Let background refreshes land in the cache, history and timings
+        wait_for_background(STALE_SETTINGS["drain_timeout"])
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile}", file=sys.stderr)
+        if _history is not None:
+            _history.close()
+        if _quota is not None:
+            _quota.flush()
+        if replay_server is not None:
+            replay_server.stop()
+            print(f"Replay stats: {replay_server.stats}", file=sys.stderr)
+        if replay_cache_dir is not None:
+            import shutil
+
+            shutil.rmtree(replay_cache_dir, ignore_errors=True)
+        if args.key_stats:
+            print_key_usage(api_keys)
+        if _timings is not None:
+            _timings.add("total", time.perf_counter_ns() - started)
+            write_timings(args.timings, args.timings_file)
+
+
+# =============================================================================
+# WRITE TIMINGS
+# Function to emit the collected timings to stderr or a file
+# =============================================================================
+def write_timings(output_format, path=None):
+    text = _timings.format(output_format, METRICS_PREFIX)
+    if path is None:
+        sys.stderr.write(text)
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+# =============================================================================
+# LOAD API KEYS
+# Function to collect the API keys from --api-key, WEATHER_API_KEYS or
+# WEATHER_API_KEY, each looked up in the environment before the .env file
+# =============================================================================
+def load_api_keys(api_key_arg=None, env_file=None):
+    if api_key_arg:
+        return list(dict.fromkeys(api_key_arg.replace(",", " ").split()))
+
+    # ./.env if there is one, else the .env in the root directory
+    if env_file is None and os.path.isfile(".env"):
+        env_file = ".env"
+    return get_api_keys(("WEATHER_API_KEYS", "WEATHER_API_KEY"), env_file)
+
+
+# =============================================================================
+# PRINT KEY USAGE
+# Function to report requests and ejections per API key, showing only the
+# last characters of each key
+# =============================================================================
+def print_key_usage(api_keys):
+    if _key_pool is not None:
+        usage = _key_pool.usage()
+    else:
+        usage = [{"key": key, "requests": None} for key in api_keys]
+
+    for entry in usage:
+        line = f"Key …{entry['key'][-4:]}: "
+        if entry["requests"] is None:
+            line += "only key, not pooled"
+        else:
+            line += f"{entry['requests']} requests, {entry['ejections']} ejections"
+            if entry["ejected_for"]:
+                line += (
+                    f" (last status {entry['last_status']}, "
+                    f"back in {entry['ejected_for']}s)"
+                )
+        print(line, file=sys.stderr)
+
+
+# =============================================================================
+# RUN - Execute the requested mode once arguments are validated
+# =============================================================================
+def run(args, locations, api_keys):
+    # Set up the local response cache
+    cache = None
+    if not args.no_cache:
+        cache = ResponseCache(
+            args.cache_dir,
+            max_entries=max(
+                args.cache_entries, len(locations) * CACHE_ENTRIES_PER_LOCATION
+            ),
+            refresh=args.refresh,
+            pinned=PINNED_CACHE_KEYS,
+        )
+        if _timings is not None:
+            from utils.timing_utils import TimedCache
+
+            cache = TimedCache(cache, _timings)
+
+    # History mode - summarize stored observations, no API key needed
+    if args.history:
+        end = args.until if args.until is not None else time.time()
+        start = args.since if args.since is not None else end - DEFAULT_HISTORY_WINDOW
+        show_history(
+            locations,
+            start,
+            end,
+            use_fahrenheit=not args.celsius,
+            cache=cache,
+            output_format=args.format,
+        )
+        return
+
+    # The first API key goes into every URL; with several keys the pool
+    # swaps in the one each request is sent with
+    api_key = api_keys[0] if api_keys else None
+    if not api_key and args.replay:
+        # The stand-in server does not check keys
+        api_key = "replay"
+
+    # Check if API key was found
+    if not api_key:
+        print(
+            f"{COLORS['RED']}Error: API key is required. Provide it with --api-key or set WEATHER_API_KEY environment variable.{COLORS['RESET']}"
+        )
+        sys.exit(1)  # Exit with error code
+
+    trend_days = args.trend_days if args.trend else 0
+
+    # Serve mode - answer lookups over HTTP until interrupted
+    if args.serve:
+        serve_weather(
+            api_key,
+            args.host,
+            args.port,
+            use_fahrenheit=not args.celsius,
+            cache=cache,
+            current_ttl=args.cache_ttl,
+            strategy=args.fetch_strategy,
+            max_workers=args.workers,
+        )
+        return
+
+    # Watch mode - keep refreshing a single location until interrupted
+    if args.watch is not None:
+        watch_weather(
+            api_key,
+            locations[0],
+            args.watch,
+            use_fahrenheit=not args.celsius,
+            cache=cache,
+            current_ttl=args.cache_ttl,
+            trend_days=trend_days,
+        )
+        return
+
+    # Prefetch - keep every location fresh in the cache until interrupted
+    if args.prefetch is not None:
+        prefetch_locations(
+            api_key,
+            locations,
+            args.prefetch,
+            args.workers,
+            cache,
+            args.cache_ttl,
+        )
+        return
+
+    # Warm-up - resolve every location into the index and cache, then exit
+    if args.warm:
+        warm_locations(
+            api_key,
+            locations,
+            args.workers,
+            cache,
+            args.cache_ttl,
+            args.fetch_strategy,
+        )
+        return
+
+    # Single location - fetch and display, exiting on failure
+    if len(locations) == 1:
+        data = get_weather(
+            api_key,
+            locations[0],
+            cache,
+            args.cache_ttl,
+            args.fetch_strategy,
+            trend_days,
+        )
+
+        if args.format == "table":
+            table = render_table([data], use_fahrenheit=not args.celsius)
+            write_output("\n".join(table) + "\n")
+            return
+
+        if args.format != "text":
+            record = build_weather_record(data, locations[0])
+            write_weather_records([record], args.format)
+            return
+
+        # Display weather information
+        # Note: --celsius flag inverts the use_fahrenheit parameter
+        display_weather(data, use_fahrenheit=not args.celsius)
+        return
+
+    # Batch mode - fetch all locations concurrently, report failures per location.
+    # Structured formats stream each location as soon as it arrives.
+    failures = []
+    results = get_weather_batch(
+        api_key,
+        locations,
+        args.workers,
+        cache,
+        args.cache_ttl,
+        args.fetch_strategy,
+        ordered=args.format in ("text", "table"),
+        trend_days=trend_days,
+    )
+
+    def successful_results():
+        for location, data, error in results:
+            if error is not None:
+                failures.append(location)
+                print(
+                    f"{COLORS['RED']}Error fetching weather data for {location}: "
+                    f"{describe_error(error)}{COLORS['RESET']}",
+                    file=sys.stderr,
+                )
+                continue
+            yield location, data
+
+    if args.format == "text":
+        # Build every panel first and emit them with one write
+        frames = [
+            format_panel(data, use_fahrenheit=not args.celsius)
+            for _, data in successful_results()
+        ]
+        write_output("".join(frames))
+    elif args.format == "table":
+        # Every row in one table and one write
+        reports = [data for _, data in successful_results()]
+        if reports:
+            with timed("render"):
+                table = render_table(reports, use_fahrenheit=not args.celsius)
+            write_output("\n".join(table) + "\n")
+    else:
+        write_weather_records(
+            (
+                build_weather_record(data, location)
+                for location, data in successful_results()
+            ),
+            args.format,
+        )
+
+    # Exit with error code if any location failed
+    if failures:
+        sys.exit(1)
 
 
 # If this script is run directly (not imported)
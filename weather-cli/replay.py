@@ -0,0 +1,231 @@
+# =============================================================================
+# RECORD / REPLAY
+# Offline stand-in for api.weatherapi.com.
+#
+# Recorder saves the raw body of every successful API response as
+# DIR/<endpoint>/<location>.json (e.g. DIR/current/london.json). ReplayServer
+# is a local HTTP server that serves those files back under the same URLs as
+# the real API, with optional injected latency and errors, so the whole CLI
+# (session, retries, timeouts, cache) can be exercised without a network.
+#
+# Standalone usage: python weather-cli/replay.py DIR [--port 8765] ...
+# =============================================================================
+import argparse
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# =============================================================================
+# REPLAY SETTINGS
+# =============================================================================
+# Status returned for injected errors; retried by the CLI's session
+DEFAULT_ERROR_STATUS = 503
+
+# Body WeatherAPI returns for an unknown location
+NO_MATCH_ERROR = {"error": {"code": 1006, "message": "No matching location found."}}
+
+
+# =============================================================================
+# FIXTURE PATH
+# Function to map an API URL to its recording, ignoring the key and date
+# =============================================================================
+def fixture_path(directory, url):
+    parts = urlsplit(url)
+    endpoint = os.path.basename(parts.path)
+    if endpoint.endswith(".json"):
+        endpoint = endpoint[: -len(".json")]
+
+    query = parse_qs(parts.query).get("q", [""])[0]
+    slug = re.sub(r"[^a-z0-9.,-]+", "_", " ".join(query.lower().split())) or "_"
+    return os.path.join(directory, endpoint, f"{slug}.json")
+
+
+# =============================================================================
+# RECORDER
+# Saves raw API responses so they can be replayed later
+# =============================================================================
+class Recorder:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def record(self, url, body):
+        path = fixture_path(self.directory, url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write atomically so a replay never sees half a file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(body)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+# =============================================================================
+# REPLAY SERVER
+# Serves recorded responses with configurable latency and error rate
+# =============================================================================
+class ReplayServer:
+    def __init__(
+        self,
+        directory,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        error_rate=0.0,
+        error_status=DEFAULT_ERROR_STATUS,
+        seed=None,
+    ):
+        self.directory = directory
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        # Seeded so injected errors can be reproduced run to run
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "served": 0, "missing": 0, "errors": 0}
+
+        replay = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                replay.handle(self)
+
+            def log_message(self, format, *args):
+                # Keep replayed runs quiet
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def handle(self, request):
+        self._count("requests")
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            inject_error = self._random.random() < self.error_rate
+        if inject_error:
+            self._count("errors")
+            self.send(request, self.error_status, {"error": {"message": "injected"}})
+            return
+
+        # Recorded with split requests - make the client fall back to them the
+        # same way it does for keys without forecast access
+        path = fixture_path(self.directory, request.path)
+        if not os.path.exists(path) and self._has_split_recording(request.path):
+            self.send(request, 403, {"error": {"message": "forecast not recorded"}})
+            return
+
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            self._count("missing")
+            self.send(request, 400, NO_MATCH_ERROR)
+            return
+
+        self._count("served")
+        self.send(request, 200, body)
+
+    def _has_split_recording(self, url):
+        if "/forecast.json" not in url:
+            return False
+        current_url = url.replace("/forecast.json", "/current.json")
+        return os.path.exists(fixture_path(self.directory, current_url))
+
+    def send(self, request, status, body):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(body)))
+        if status in (429, 503):
+            request.send_header("Retry-After", "0")
+        request.end_headers()
+        request.wfile.write(body)
+
+    def start(self):
+        # Serve from a background thread so the CLI can run in-process
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+# =============================================================================
+# MAIN - Run the replay server on its own
+# =============================================================================
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve recorded weather API responses for offline runs"
+    )
+    parser.add_argument("directory", help="Directory written by main.py --record")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds added to every response"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with an error (0-1)",
+    )
+    parser.add_argument(
+        "--error-status",
+        type=int,
+        default=DEFAULT_ERROR_STATUS,
+        help=f"Status code for injected errors (default: {DEFAULT_ERROR_STATUS})",
+    )
+    parser.add_argument("--seed", type=int, help="Random seed for injected errors")
+    args = parser.parse_args()
+
+    server = ReplayServer(
+        args.directory,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        seed=args.seed,
+    )
+    print(f"Replaying {args.directory} at {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        print(json.dumps(server.stats))
+
+
+if __name__ == "__main__":
+    main()
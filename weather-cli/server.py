@@ -0,0 +1,197 @@
+# =============================================================================
+# IMPORTS
+# =============================================================================
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from utils.error_utils import describe_error, mask_api_key
+
+# =============================================================================
+# SERVER SETTINGS
+# =============================================================================
+# Seconds to wait for a client to send its request
+REQUEST_TIMEOUT = 10
+
+# Largest request head (request line + headers) we are willing to read
+MAX_REQUEST_SIZE = 16 * 1024
+
+HTTP_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    502: "Bad Gateway",
+}
+
+
+# =============================================================================
+# WEATHER SERVER
+# Small asyncio HTTP server exposing weather lookups as JSON or rendered text.
+#
+# submit(location) must return a concurrent.futures.Future for the combined
+# weather data, render(data) the panel lines, serialize(data, location) a
+# JSON-ready record, and normalize(location) the key that equivalent queries
+# share. With metrics, /metrics?format=FORMAT serves metrics(FORMAT) as
+# (text, content type). Results are kept in an in-memory TTL cache, except
+# when is_stale(data) says they are already being refreshed, and concurrent
+# requests for the same location wait on a single upstream fetch instead of
+# triggering duplicates. normalize and submit may read the disk cache, so
+# they run in the event loop's default executor rather than on the loop.
+# =============================================================================
+class WeatherServer:
+    def __init__(
+        self,
+        submit,
+        render,
+        serialize,
+        normalize,
+        cache,
+        ttl,
+        metrics=None,
+        is_stale=None,
+    ):
+        self.submit = submit
+        self.render = render
+        self.serialize = serialize
+        self.normalize = normalize
+        self.cache = cache
+        self.ttl = ttl
+        self.metrics = metrics
+        self.is_stale = is_stale
+        # Upstream fetches currently in progress, by normalized location
+        self._inflight = {}
+
+    # -------------------------------------------------------------------------
+    # Lookup with caching and request coalescing
+    # -------------------------------------------------------------------------
+    async def lookup(self, location):
+        loop = asyncio.get_running_loop()
+        key = await loop.run_in_executor(None, self.normalize, location)
+
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        # Join an in-flight fetch for the same location if there is one
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, location))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield so one client disconnecting does not cancel the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, location):
+        loop = asyncio.get_running_loop()
+        future = await loop.run_in_executor(None, self.submit, location)
+        data = await asyncio.wrap_future(future)
+        if self.is_stale is None or not self.is_stale(data):
+            self.cache.put(key, data, time.time() + self.ttl)
+        return data
+
+    # -------------------------------------------------------------------------
+    # HTTP handling
+    # -------------------------------------------------------------------------
+    async def handle_client(self, reader, writer):
+        try:
+            try:
+                head = await asyncio.wait_for(
+                    reader.readuntil(b"\r\n\r\n"), REQUEST_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                await self.send(writer, 408, {"error": "request timeout"})
+                return
+            except asyncio.LimitOverrunError:
+                await self.send(writer, 413, {"error": "request too large"})
+                return
+            except asyncio.IncompleteReadError:
+                # Client went away before finishing the request
+                return
+
+            try:
+                status, body, content_type = await self.route(head)
+            except Exception as e:
+                status, body, content_type = 500, {"error": mask_api_key(str(e))}, None
+            await self.send(writer, status, body, content_type)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, head):
+        request_line = head.split(b"\r\n", 1)[0].decode("latin-1")
+        try:
+            method, target, _ = request_line.split(" ", 2)
+        except ValueError:
+            return 400, {"error": "malformed request line"}, None
+
+        if method != "GET":
+            return 405, {"error": f"method {method} not allowed"}, None
+
+        url = urlsplit(target)
+        params = parse_qs(url.query)
+        if url.path == "/metrics" and self.metrics is not None:
+            text, content_type = self.metrics(params.get("format", [""])[0])
+            return 200, text, content_type
+        if url.path != "/weather":
+            return 404, {"error": f"no route for {url.path}"}, None
+
+        location = params.get("q", [""])[0].strip()
+        if not location:
+            return 400, {"error": "missing q parameter"}, None
+
+        try:
+            data = await self.lookup(location)
+        except Exception as e:
+            return self.describe_error(e)
+
+        if params.get("format", ["json"])[0] == "text":
+            text = "\n".join(self.render(data)) + "\n"
+            return 200, text, "text/plain; charset=utf-8"
+        return 200, self.serialize(data, location), None
+
+    def describe_error(self, error):
+        # Never echo the upstream URL back to clients - it contains the API key
+        response = getattr(error, "response", None)
+        if response is None:
+            return (
+                502,
+                {"error": f"upstream request failed ({type(error).__name__})"},
+                None,
+            )
+
+        # Pass through client errors (e.g. unknown location) from the API
+        status = 400 if response.status_code == 400 else 502
+        return status, {"error": describe_error(error)}, None
+
+    async def send(self, writer, status, body, content_type=None):
+        if content_type is None:
+            body = json.dumps(body)
+            content_type = "application/json"
+        payload = body.encode("utf-8")
+
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(payload)}\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+
+    # -------------------------------------------------------------------------
+    # Entry point
+    # -------------------------------------------------------------------------
+    async def serve_forever(self, host, port):
+        server = await asyncio.start_server(
+            self.handle_client, host, port, limit=MAX_REQUEST_SIZE
+        )
+        async with server:
+            await server.serve_forever()